@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark: local archive copy, per tier
+
+Writes a multi-GB file and archives it with each archive_copy tier on its own
+(reflink, hardlink, copy_file_range, copy), reporting wall time including
+write-back (sync) and CPU seconds of this process. Tiers the filesystem
+doesn't support are shown as n/a. Run it with --dir on the volume that holds
+the queue and the archive to see what the watcher gets.
+
+Usage:
+    python benchmarks/bench_archive.py [file_gb] [--dir DIR]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "execution"))
+from archive_copy import TIERS, copy_file
+
+BLOCK = 16 * 1024 * 1024
+
+
+def cpu_seconds() -> float:
+    times = os.times()
+    return times.user + times.system
+
+
+def make_source(path: Path, size: int):
+    block = os.urandom(BLOCK)
+    with open(path, "wb") as f:
+        for _ in range(size // BLOCK):
+            f.write(block)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file_gb", nargs="?", type=float, default=4)
+    parser.add_argument("--dir", default=None, help="scratch directory (default: system temp)")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_archive_", dir=args.dir))
+    source = workdir / "clip.mov"
+    make_source(source, int(args.file_gb * 1024 ** 3))
+
+    print(f"{args.file_gb:g} GB file in {workdir}")
+    print(f"{'tier':<16} {'wall s':>8} {'cpu s':>7} {'MB/s':>8}")
+    for name, func in TIERS:
+        dest = workdir / f"archive_{name}.mov"
+        cpu, wall = cpu_seconds(), time.perf_counter()
+        try:
+            copy_file(source, dest, ((name, func),))
+        except OSError as e:
+            print(f"{name:<16} {'n/a':>8}  ({e.strerror})")
+            continue
+        os.sync()  # count write-back, not just page-cache fill
+        wall, cpu = time.perf_counter() - wall, cpu_seconds() - cpu
+        size = dest.stat().st_size
+        assert size == source.stat().st_size
+        print(f"{name:<16} {wall:>8.2f} {cpu:>7.2f} {size / 1e6 / wall:>8.0f}")
+        dest.unlink()
+
+    source.unlink()
+    workdir.rmdir()
+
+
+if __name__ == "__main__":
+    main()
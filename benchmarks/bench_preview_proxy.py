@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /preview original vs low-bitrate proxy over a slow link
+
+Generates a 4K clip with ffmpeg, builds its preview proxy, and serves
+/preview through a WSGI middleware that throttles to a mobile-data rate and
+counts bytes. For the original and the proxy it reports time to first frame
+(ffmpeg decoding one frame from the URL) and the bytes that took, plus the
+bytes needed to watch the whole clip.
+
+Usage:
+    python benchmarks/bench_preview_proxy.py [link_mbit_s] [clip_seconds]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from werkzeug.serving import make_server
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from bench_rotate import make_sample
+
+THROTTLE_BLOCK = 64 * 1024
+
+
+class ThrottledApp:
+    """WSGI middleware limiting response bandwidth and counting bytes sent."""
+
+    def __init__(self, app, bytes_per_second: float):
+        self.app = app
+        self.bytes_per_second = bytes_per_second
+        self.sent = 0
+
+    def __call__(self, environ, start_response):
+        for chunk in self.app(environ, start_response):
+            for start in range(0, len(chunk), THROTTLE_BLOCK):
+                piece = chunk[start:start + THROTTLE_BLOCK]
+                time.sleep(len(piece) / self.bytes_per_second)
+                self.sent += len(piece)
+                yield piece
+
+
+def time_to_first_frame(url: str) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        ["ffmpeg", "-v", "quiet", "-i", url, "-frames:v", "1", "-f", "null", "-"],
+        check=True
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    link_mbit = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    os.environ.update(TMPDIR=tempfile.mkdtemp(prefix="bench_proxy_"), TELEGRAM_BOT_TOKEN="")
+    import server
+
+    sample = server.UPLOAD_DIR / "bench.mov"
+    make_sample(sample, 3840, 2160, seconds)
+    server.pending_videos["bench"] = {
+        "path": str(sample), "filename": sample.name, "state": server.STATE_AWAITING_TITLE
+    }
+
+    throttled = ThrottledApp(server.app, link_mbit * 1024 * 1024 / 8)
+    http = make_server("127.0.0.1", 0, throttled, threaded=True)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{http.server_port}/preview/bench"
+
+    print(f"{seconds}s 4K clip over {link_mbit:g} Mbit/s")
+    print(f"{'serving':<9} {'first frame s':>14} {'bytes to frame':>15} {'full file MB':>13}")
+
+    throttled.sent = 0
+    ttff = time_to_first_frame(url)
+    print(f"{'original':<9} {ttff:>14.2f} {throttled.sent:>15,} {sample.stat().st_size / 1e6:>13.1f}")
+
+    start = time.perf_counter()
+    server.preview_cache._generate("bench")
+    built = time.perf_counter() - start
+
+    throttled.sent = 0
+    ttff = time_to_first_frame(url)
+    proxy = server.preview_cache.path("bench")
+    print(f"{'proxy':<9} {ttff:>14.2f} {throttled.sent:>15,} {proxy.stat().st_size / 1e6:>13.1f}")
+    print(f"proxy generated in {built:.1f}s")
+    http.shutdown()
+
+
+if __name__ == "__main__":
+    main()
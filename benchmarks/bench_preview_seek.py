@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /preview seek latency on a multi-GB file
+
+Starts gunicorn (gthread) on a sparse file registered as a pending video and
+issues random 1 MB Range requests, as a phone does while scrubbing. Compares
+"send_file" (Flask's send_file, the old /preview, whose ranges are copied
+through Python) with "preview" (the current route, sendfile-backed). Reports
+time to first byte, total time per request and worker CPU seconds.
+
+Usage:
+    python benchmarks/bench_preview_seek.py [file_gb]
+"""
+
+import os
+import sys
+import time
+import random
+import socket
+import tempfile
+import statistics
+import subprocess
+import http.client
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+REQUESTS = 20  # the send_file route reads up to each range start, so keep this small
+RANGE_SIZE = 1024 * 1024
+
+
+def create_app():
+    """gunicorn entry point: the server app plus the old send_file route."""
+    import server
+    from flask import send_file
+
+    @server.app.route("/send_file/<video_id>")
+    def bench_send_file(video_id):
+        return send_file(server.pending_videos[video_id]["path"], mimetype="video/mp4")
+
+    return server.app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def worker_cpu(master_pid: int) -> float:
+    """CPU seconds used by gunicorn's worker processes (Linux /proc)."""
+    total = 0.0
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == master_pid:  # ppid
+            total += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return total
+
+
+def run(port: int, path: str, size: int) -> tuple:
+    """Random Range requests; returns (ttfb ms list, total ms list)."""
+    ttfb, total = [], []
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    for _ in range(REQUESTS):
+        start = random.randrange(0, size - RANGE_SIZE)
+        began = time.perf_counter()
+        conn.request("GET", path, headers={"Range": f"bytes={start}-{start + RANGE_SIZE - 1}"})
+        response = conn.getresponse()
+        response.read(1)
+        ttfb.append((time.perf_counter() - began) * 1000)
+        response.read()
+        total.append((time.perf_counter() - began) * 1000)
+        assert response.status == 206, response.status
+    conn.close()
+    return ttfb, total
+
+
+def main():
+    file_gb = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    tmpdir = tempfile.mkdtemp(prefix="bench_preview_")
+    env = dict(os.environ, TMPDIR=tmpdir, TELEGRAM_BOT_TOKEN="")
+    upload_dir = Path(tmpdir) / "yt_uploads"
+    upload_dir.mkdir()
+
+    # Sparse file: seeks are real, but no disk space or write time needed
+    size = int(file_gb * 1024 ** 3)
+    video_path = upload_dir / "bench.mov"
+    with open(video_path, "wb") as f:
+        f.truncate(size)
+
+    from state_store import SQLiteStateStore
+    store = SQLiteStateStore(upload_dir / "video_state.db")
+    store.load()
+    store.videos["bench"] = {"path": str(video_path), "filename": "bench.mov", "state": "awaiting_title"}
+
+    port = free_port()
+    gunicorn = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--chdir", str(Path(__file__).parent),
+         "--bind", f"127.0.0.1:{port}", "--workers", "1", "--threads", "4",
+         "--log-level", "warning", "bench_preview_seek:create_app()"],
+        env=env
+    )
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        print(f"{file_gb:g} GB sparse file, {REQUESTS} random {RANGE_SIZE // 1024} KB ranges")
+        print(f"{'route':<10} {'ttfb p50':>9} {'ttfb p99':>9} {'total p50':>10} {'cpu s':>7}")
+        for name, path in (("send_file", "/send_file/bench"), ("preview", "/preview/bench")):
+            cpu = worker_cpu(gunicorn.pid)
+            ttfb, total = run(port, path, size)
+            cpu = worker_cpu(gunicorn.pid) - cpu
+            p99 = statistics.quantiles(ttfb, n=100)[98]
+            print(f"{name:<10} {statistics.median(ttfb):>8.2f}ms {p99:>7.2f}ms "
+                  f"{statistics.median(total):>8.2f}ms {cpu:>7.2f}")
+    finally:
+        gunicorn.terminate()
+        gunicorn.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: portrait rotation, metadata-only vs re-encode
+
+Generates portrait 1080p and 4K test clips with ffmpeg, then times
+rotate_video_lossless() (display matrix + stream copy) against the
+transpose=1 re-encode. Reports wall time and CPU seconds spent in ffmpeg.
+
+Usage:
+    python benchmarks/bench_rotate.py [clip_seconds]
+"""
+
+import os
+import sys
+import time
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+SAMPLES = {"1080p": (1080, 1920), "4K": (2160, 3840)}
+
+
+def make_sample(path: Path, width: int, height: int, seconds: int):
+    subprocess.run(
+        ["ffmpeg", "-y", "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate=30",
+         "-f", "lavfi", "-i", "sine=frequency=440", "-t", str(seconds),
+         "-c:v", "libx264", "-preset", "veryfast", "-c:a", "aac", "-shortest", str(path)],
+        capture_output=True, check=True
+    )
+
+
+def children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(func) -> tuple:
+    wall, cpu = time.perf_counter(), children_cpu()
+    ok = func()
+    return ok, time.perf_counter() - wall, children_cpu() - cpu
+
+
+def main():
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    os.environ.setdefault("TMPDIR", tempfile.mkdtemp(prefix="bench_rotate_"))
+    import server
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_rotate_"))
+    print(f"{seconds}s portrait clips")
+    print(f"{'sample':<7} {'path':<10} {'wall s':>8} {'cpu s':>8}")
+
+    for name, (width, height) in SAMPLES.items():
+        sample = workdir / f"{name}.mp4"
+        make_sample(sample, width, height, seconds)
+
+        ok, wall, cpu = measure(lambda: server.rotate_video_lossless(sample, workdir / f"copy_{name}.mp4"))
+        print(f"{name:<7} {'copy' if ok else 'copy (n/a)':<10} {wall:>8.2f} {cpu:>8.2f}")
+
+        ok, wall, cpu = measure(lambda: subprocess.run(
+            ["ffmpeg", "-y", "-i", str(sample), "-vf", "transpose=1", "-c:a", "copy",
+             str(workdir / f"encode_{name}.mp4")],
+            capture_output=True
+        ).returncode == 0)
+        print(f"{name:<7} {'re-encode':<10} {wall:>8.2f} {cpu:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
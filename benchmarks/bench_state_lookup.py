@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: reply-to-title and duplicate-filename lookups
+
+Compares the old linear scan over pending_videos with the indexed find()
+lookups of both state backends at 100, 1k and 10k pending entries.
+
+Usage:
+    python benchmarks/bench_state_lookup.py
+"""
+
+import sys
+import json
+import time
+import random
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from state_store import JournalStateStore, SQLiteStateStore
+
+SIZES = [100, 1_000, 10_000]
+LOOKUPS = 1_000
+SCAN_LOOKUPS = 20  # the linear scan is slow; sample fewer
+
+
+def make_videos(count: int) -> dict:
+    return {
+        f"vid{i:06d}": {
+            "filename": f"IMG_{i:06d}.MOV",
+            "message_id": 100_000 + i,
+            "state": "awaiting_title",
+            "uploaded_at": "2025-01-01T00:00:00"
+        }
+        for i in range(count)
+    }
+
+
+def build_journal_store(directory: Path, videos: dict) -> JournalStateStore:
+    snapshot = directory / "video_state.json"
+    snapshot.write_text(json.dumps({"pending_videos": videos, "partial_uploads": {}}))
+    store = JournalStateStore(snapshot)
+    store.load()
+    return store
+
+
+def build_sqlite_store(directory: Path, videos: dict) -> SQLiteStateStore:
+    store = SQLiteStateStore(directory / "video_state.db")
+    store.load()
+    with store.transaction():
+        for video_id, video in videos.items():
+            store.videos[video_id] = video
+    return store
+
+
+def time_per_lookup(func, keys: list) -> float:
+    """Average microseconds per call."""
+    start = time.perf_counter()
+    for key in keys:
+        func(key)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def linear_scan(store, message_id):
+    for vid, v in store.videos.items():
+        if v.get("message_id") == message_id:
+            return vid
+
+
+def main():
+    print(f"{'backend':<10} {'entries':>8} {'scan µs':>10} {'message_id µs':>14} {'filename µs':>12}")
+    for count in SIZES:
+        videos = make_videos(count)
+        message_ids = [100_000 + random.randrange(count) for _ in range(LOOKUPS)]
+        filenames = [f"IMG_{random.randrange(count):06d}.MOV" for _ in range(LOOKUPS)]
+
+        for name, build in (("journal", build_journal_store), ("sqlite", build_sqlite_store)):
+            store = build(Path(tempfile.mkdtemp(prefix="bench_state_")), videos)
+            scan = time_per_lookup(lambda m: linear_scan(store, m), message_ids[:SCAN_LOOKUPS])
+            by_message = time_per_lookup(lambda m: store.videos.find("message_id", m), message_ids)
+            by_filename = time_per_lookup(lambda f: store.videos.find("filename", f), filenames)
+            print(f"{name:<10} {count:>8} {scan:>10.1f} {by_message:>14.2f} {by_filename:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-edit latency of the pooled Telegram client
+
+Sends editMessageText calls to a local fake Bot API, once with a fresh
+requests.post per call (the old helpers) and once through the shared
+TelegramClient. The fake server charges CONNECT_DELAY per new connection to
+stand in for the TCP + TLS handshake to api.telegram.org.
+
+Usage:
+    python benchmarks/bench_telegram_client.py [connect_delay_ms]
+"""
+
+import sys
+import time
+import statistics
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from fake_telegram import start_fake_telegram
+
+EDITS = 200
+
+
+def measure(send) -> list:
+    latencies = []
+    for i in range(EDITS):
+        start = time.perf_counter()
+        send({"chat_id": 1, "message_id": 1, "text": f"⏳ Uploading... {i}%"})
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    connect_delay = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.05
+    fake = start_fake_telegram(connect_delay=connect_delay)
+
+    import server
+    client = server.TelegramClient("TOKEN", base_url=fake.base_url)
+    url = f"{fake.base_url}/botTOKEN/editMessageText"
+
+    results = {
+        "requests.post": measure(lambda data: requests.post(url, json=data, timeout=30)),
+        "TelegramClient": measure(lambda data: client.call("editMessageText", data)),
+    }
+
+    print(f"connect delay: {connect_delay * 1000:.0f} ms, {EDITS} edits each")
+    print(f"{'client':<16} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+    for name, latencies in results.items():
+        p99 = statistics.quantiles(latencies, n=100)[98]
+        print(f"{name:<16} {statistics.median(latencies):>8.2f} {p99:>8.2f} "
+              f"{statistics.mean(latencies):>8.2f}")
+    print(f"connections opened: {fake.connections}")
+
+
+if __name__ == "__main__":
+    main()
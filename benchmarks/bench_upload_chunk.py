@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /upload_chunk ingest memory and throughput
+
+Posts a single chunk of 15/25/50 MB to /upload_chunk through the Flask test
+client and reports peak RSS growth and MB/s. Each run happens in a fresh child
+process so ru_maxrss reflects that run only. The "buffered" mode registers a
+throwaway route that reads the body with request.get_data() for comparison.
+
+Usage:
+    python benchmarks/bench_upload_chunk.py
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+CHUNK_SIZES_MB = [15, 25, 50]
+MODES = ["buffered", "stream"]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_child(mode: str, size_mb: int):
+    """Run one upload in this process and print a JSON result line."""
+    import server
+    from flask import request, jsonify
+
+    if mode == "buffered":
+        @server.app.route("/bench_buffered_chunk", methods=["POST"])
+        def bench_buffered_chunk():
+            data = request.get_data()
+            with open(server.UPLOAD_DIR / "bench_buffered.bin", "wb") as f:
+                f.write(data)
+            return jsonify({"offset": len(data)})
+
+    size = size_mb * 1024 * 1024
+    with tempfile.NamedTemporaryFile(delete=False) as src:
+        block = os.urandom(1024 * 1024)
+        for _ in range(size_mb):
+            src.write(block)
+
+    client = server.app.test_client()
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+
+    with open(src.name, "rb") as body:
+        if mode == "buffered":
+            response = client.post(
+                "/bench_buffered_chunk", input_stream=body, content_length=size,
+                content_type="application/octet-stream"
+            )
+        else:
+            response = client.post(
+                "/upload_chunk", input_stream=body, content_length=size,
+                content_type="application/octet-stream",
+                headers={"X-Filename": f"bench_{size_mb}mb.bin",
+                         "X-Total-Size": str(size * 2), "X-Offset": "0"}
+            )
+
+    elapsed = time.perf_counter() - start
+    os.unlink(src.name)
+    assert response.status_code == 200, response.data
+
+    print(json.dumps({
+        "mode": mode,
+        "size_mb": size_mb,
+        "rss_growth_mb": round(peak_rss_mb() - baseline, 1),
+        "mb_per_s": round(size_mb / elapsed, 1)
+    }))
+
+
+def main():
+    # Point the server's UPLOAD_DIR at a scratch directory
+    env = dict(os.environ, TMPDIR=tempfile.mkdtemp(prefix="bench_upload_"))
+    print(f"{'mode':<10} {'chunk':>8} {'peak RSS +MB':>14} {'MB/s':>8}")
+    for size_mb in CHUNK_SIZES_MB:
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", mode, str(size_mb)],
+                capture_output=True, text=True, check=True, env=env
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{result['mode']:<10} {result['size_mb']:>6}MB "
+                  f"{result['rss_growth_mb']:>14} {result['mb_per_s']:>8}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        run_child(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark: watcher batch wall-clock time, sequential vs staged pipeline
+
+Drops 20 files into a scratch queue and runs them through the watcher against
+a stub server with a shared, bandwidth-limited uplink. ffprobe/ffmpeg are
+replaced by fixed delays (PROBE_SECONDS, THUMBNAIL_SECONDS) so the result
+doesn't depend on codecs. "sequential" runs each file through the watcher's
+stage functions one after another, as the old main loop did; "pipeline"
+submits all files to VideoPipeline.
+
+Usage:
+    python benchmarks/bench_watcher_pipeline.py [uplink_mb_s]
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "execution"))
+
+FILES = 20
+FILE_MB = 20
+PROBE_SECONDS = 0.3
+THUMBNAIL_SECONDS = 0.5
+
+
+class Uplink:
+    """Token bucket shared by all uploads: total bandwidth is fixed."""
+
+    def __init__(self, bytes_per_second: float):
+        self.bytes_per_second = bytes_per_second
+        self.available_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def transfer(self, size: int):
+        with self.lock:
+            start = max(self.available_at, time.monotonic())
+            self.available_at = start + size / self.bytes_per_second
+            done = self.available_at
+        time.sleep(max(0, done - time.monotonic()))
+
+
+def start_stub_server(uplink: Uplink) -> ThreadingHTTPServer:
+    """Minimal /upload_status + serial /upload_chunk server that discards data."""
+    received = {}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def reply(self, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self.reply({"offset": 0})
+
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            remaining = length
+            while remaining:
+                remaining -= len(self.rfile.read(min(remaining, 1024 * 1024)))
+            uplink.transfer(length)
+
+            filename = self.headers["X-Filename"]
+            total = int(self.headers["X-Total-Size"])
+            with lock:
+                received[filename] = int(self.headers["X-Offset"]) + length
+                offset = received[filename]
+            self.reply({"status": "complete" if offset >= total else "partial", "offset": offset})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_queue(directory: Path) -> list:
+    directory.mkdir(parents=True)
+    paths = []
+    for i in range(FILES):
+        path = directory / f"clip_{i:02d}.mov"
+        with open(path, "wb") as f:
+            # Distinct content, or the pipeline holds back copies of one clip
+            f.write(f"{directory.name} {i}".encode().ljust(FILE_MB * 1024 * 1024, b"\0"))
+        paths.append(path)
+    return paths
+
+
+def process_sequential(watch_icloud, path: Path, session):
+    """Run one file through every stage in turn."""
+    metadata = watch_icloud.probe_video(path)
+    if metadata is None or watch_icloud.skip_duplicate(session, path, metadata["digest"]):
+        return
+    message_id = watch_icloud.send_preview(path)
+    watch_icloud.archive_locally(path)
+    uploaded = watch_icloud.upload_video_chunked(session, path, metadata, message_id)
+    watch_icloud.finish_video(path, uploaded, metadata["digest"])
+
+
+def main():
+    uplink_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 100
+    workdir = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    os.chdir(workdir)  # watcher logs go to ./logs
+
+    server = start_stub_server(Uplink(uplink_mb * 1024 * 1024))
+    os.environ.update(RAILWAY_URL=f"http://127.0.0.1:{server.server_port}", TELEGRAM_BOT_TOKEN="")
+
+    import watch_icloud
+    logging.getLogger("watcher").setLevel(logging.WARNING)
+    watch_icloud.LOCAL_ARCHIVE_PATH = str(workdir / "archive")
+    watch_icloud.get_video_metadata = lambda path: time.sleep(PROBE_SECONDS) or {"duration": "1:00"}
+    watch_icloud.generate_thumbnail = lambda video, output: time.sleep(THUMBNAIL_SECONDS) or False
+
+    print(f"{FILES} files x {FILE_MB} MB, uplink {uplink_mb:g} MB/s, "
+          f"probe {PROBE_SECONDS}s, thumbnail {THUMBNAIL_SECONDS}s")
+
+    paths = make_queue(workdir / "queue_sequential")
+    session = watch_icloud.create_session()
+    start = time.perf_counter()
+    for path in paths:
+        process_sequential(watch_icloud, path, session)
+    sequential = time.perf_counter() - start
+    print(f"{'sequential':<11} {sequential:>7.1f}s")
+
+    paths = make_queue(workdir / "queue_pipeline")
+    pipeline = watch_icloud.VideoPipeline()
+    start = time.perf_counter()
+    for path in paths:
+        pipeline.submit(path)
+    pipeline.shutdown()
+    elapsed = time.perf_counter() - start
+    assert not any(path.exists() for path in paths), "some files were not uploaded"
+    print(f"{'pipeline':<11} {elapsed:>7.1f}s  ({sequential / elapsed:.1f}x)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
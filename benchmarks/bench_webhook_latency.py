@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /webhook response latency against a slow fake Telegram
+
+Each update is a "❌ Delete" button press, which answers the callback query
+and edits the message (two Bot API calls). "inline" runs process_update()
+within the timed call, as the webhook did before; "queued" measures
+POST /webhook, which only validates and enqueues.
+
+Usage:
+    python benchmarks/bench_webhook_latency.py [telegram_latency_ms]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from fake_telegram import start_fake_telegram
+
+UPDATES = 50
+
+
+def make_update(update_id: int, video_id: str) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "data": f"action:no:{video_id}",
+            "message": {"message_id": 1, "chat": {"id": 1}}
+        }
+    }
+
+
+def summarize(name: str, latencies: list):
+    p99 = statistics.quantiles(latencies, n=100)[98]
+    print(f"{name:<8} {statistics.median(latencies):>9.2f} {p99:>9.2f}")
+
+
+def main():
+    latency = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.1
+    fake = start_fake_telegram(latency=latency)
+    os.environ.update(
+        TMPDIR=tempfile.mkdtemp(prefix="bench_webhook_"),
+        TELEGRAM_API_URL=fake.base_url,
+        TELEGRAM_BOT_TOKEN="TOKEN",
+        WEBHOOK_SECRET=""
+    )
+
+    import server
+    server.pending_videos["bench"] = {
+        "path": "/dev/null", "filename": "bench.mov", "state": server.STATE_AWAITING_PRIVACY
+    }
+    client = server.app.test_client()
+
+    inline = []
+    for i in range(UPDATES):
+        start = time.perf_counter()
+        server.process_update(make_update(i, "bench"))
+        inline.append((time.perf_counter() - start) * 1000)
+
+    queued = []
+    for i in range(UPDATES, 2 * UPDATES):
+        start = time.perf_counter()
+        response = client.post("/webhook", json=make_update(i, "bench"))
+        queued.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.data
+
+    print(f"fake Telegram latency: {latency * 1000:.0f} ms per call, {UPDATES} updates each")
+    print(f"{'mode':<8} {'p50 ms':>9} {'p99 ms':>9}")
+    summarize("inline", inline)
+    summarize("queued", queued)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Local stand-in for the Telegram Bot API used by the benchmarks.
+
+Answers every POST /bot<token>/<method> with {"ok": true} over HTTP/1.1
+keep-alive. ``connect_delay`` is paid once per TCP connection to model the
+TLS handshake to api.telegram.org; ``latency`` is paid on every request.
+"""
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, connect_delay: float = 0.0):
+        self.latency = latency
+        self.connect_delay = connect_delay
+        self.calls = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), FakeTelegramHandler)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send each response in one segment so Nagle/delayed-ACK don't add 40ms
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        time.sleep(self.server.connect_delay)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        method = self.path.rsplit("/", 1)[-1]
+        with self.server.lock:
+            self.server.calls.append((time.monotonic(), method, body))
+        time.sleep(self.server.latency)
+
+        payload = json.dumps({"ok": True, "result": {"message_id": 1}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_telegram(latency: float = 0.0, connect_delay: float = 0.0) -> FakeTelegramServer:
+    """Start the fake API in a background thread and return the server."""
+    server = FakeTelegramServer(latency, connect_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,158 @@
+"""
+Cheap file copies for the watcher's local archive.
+
+Tries, in order, the cheapest way the filesystem offers to make the archive
+copy of a queued video:
+- reflink: copy-on-write clone (FICLONE on Linux btrfs/xfs, clonefile() on
+  macOS APFS); no data is read or written
+- hardlink: a second name for the same inode, when on the same device
+- copy_file_range: in-kernel copy (Linux); no data through user space
+- copy: shutil.copy2, the plain read/write fallback
+
+copy_file() returns the name of the tier that succeeded.
+
+TeeArchive instead builds the archive copy from the chunks the upload reads
+anyway, so the file is read from disk once.
+"""
+
+import os
+import sys
+import errno
+import shutil
+import ctypes
+import ctypes.util
+import threading
+from pathlib import Path
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int)
+COPY_RANGE_BLOCK = 1024 * 1024 * 1024
+
+# Errors meaning "this tier can't do it here", as opposed to a real I/O failure
+UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.ENOTTY, errno.EPERM,
+    errno.EOPNOTSUPP, errno.ENOTSUP, errno.EMLINK, errno.EBADF
+}
+
+
+def reflink(src: Path, dst: Path):
+    """Clone src to dst sharing its blocks (copy-on-write)."""
+    if sys.platform == "darwin":
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(dst))
+        return
+
+    import fcntl
+    with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    shutil.copystat(src, dst)
+
+
+def hardlink(src: Path, dst: Path):
+    """Link dst to src's inode; the queue copy can then be deleted freely."""
+    if os.stat(src).st_dev != os.stat(dst.parent).st_dev:
+        raise OSError(errno.EXDEV, "different devices", str(dst))
+    os.link(src, dst)
+
+
+def copy_range(src: Path, dst: Path):
+    """Copy inside the kernel with copy_file_range(2)."""
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "copy_file_range is not available", str(dst))
+
+    with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), min(remaining, COPY_RANGE_BLOCK))
+            if copied == 0:
+                raise OSError(errno.EIO, "copy_file_range stopped early", str(dst))
+            remaining -= copied
+    shutil.copystat(src, dst)
+
+
+def plain_copy(src: Path, dst: Path):
+    shutil.copy2(src, dst)
+
+
+TIERS = (
+    ("reflink", reflink),
+    ("hardlink", hardlink),
+    ("copy_file_range", copy_range),
+    ("copy", plain_copy),
+)
+
+
+def copy_file(src: Path, dst: Path, tiers: tuple = TIERS) -> str:
+    """Copy src to the new path dst with the first tier that works; return its name."""
+    src, dst = Path(src), Path(dst)
+    for name, func in tiers:
+        try:
+            func(src, dst)
+            return name
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                raise
+            # A half-made copy must not block the next tier
+            dst.unlink(missing_ok=True)
+            if e.errno not in UNSUPPORTED_ERRNOS or name == tiers[-1][0]:
+                raise
+    raise OSError(errno.ENOTSUP, "no copy tier available", str(dst))
+
+
+class TeeArchive:
+    """Archive copy written from upload chunks, finalized after the upload.
+    
+    Chunks are written at their offsets into ``<dest>.partial``. finish()
+    fsyncs and renames it into place only if every byte was written; a
+    resumed upload skips what the server already has, so the caller must be
+    ready to copy the file the normal way instead.
+    """
+    
+    def __init__(self, src: Path, dest: Path):
+        self.src, self.dest = Path(src), Path(dest)
+        self.partial = self.dest.with_name(self.dest.name + ".partial")
+        self.size = os.stat(self.src).st_size
+        self.fd = os.open(self.partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.ranges = []  # sorted, merged [start, end) ranges written so far
+        self.lock = threading.Lock()
+    
+    def write(self, offset: int, data: bytes):
+        """Write one chunk at its offset; safe to call from several threads."""
+        view = memoryview(data)
+        written = 0
+        while written < len(view):
+            written += os.pwrite(self.fd, view[written:], offset + written)
+        
+        with self.lock:
+            merged = []
+            start, end = offset, offset + len(data)
+            for r_start, r_end in self.ranges:
+                if r_end < start or r_start > end:
+                    merged.append([r_start, r_end])
+                else:
+                    start, end = min(start, r_start), max(end, r_end)
+            merged.append([start, end])
+            self.ranges = sorted(merged)
+    
+    def complete(self) -> bool:
+        with self.lock:
+            return self.size == 0 or self.ranges == [[0, self.size]]
+    
+    def finish(self) -> bool:
+        """Move the archive copy into place if complete; otherwise discard it."""
+        if not self.complete():
+            self.abort()
+            return False
+        os.fsync(self.fd)
+        os.close(self.fd)
+        os.replace(self.partial, self.dest)
+        shutil.copystat(self.src, self.dest)
+        return True
+    
+    def abort(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+        self.partial.unlink(missing_ok=True)
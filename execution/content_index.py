@@ -0,0 +1,86 @@
+"""
+Content digests for the iCloud watcher.
+
+Provides:
+- file_digest(): content digest of a file: BLAKE2b over the BLAKE2b digests
+  of its BLOCK_SIZE blocks, so the server can check it from the chunks it
+  already hashes, whichever order or worker they arrive in
+- ContentIndex: persistent JSON index of the content this watcher uploaded
+  (digest -> filename, size, mtime, uploaded_at); also lets an unchanged
+  file skip re-hashing
+"""
+
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from datetime import datetime
+
+DIGEST_SIZE = 32
+BLOCK_SIZE = 1024 * 1024  # upload chunks are multiples of this, so they cover whole blocks
+READ_BLOCKS = 8  # blocks per read
+DIGEST_SCHEME = "blocks"  # recorded in index entries; older entries are re-hashed
+
+
+def new_digest():
+    return hashlib.blake2b(digest_size=DIGEST_SIZE)
+
+
+def file_digest(path: Path) -> str:
+    """Hex content digest of a file: BLAKE2b of its blocks' BLAKE2b digests."""
+    digest = new_digest()
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(BLOCK_SIZE * READ_BLOCKS)
+            if not data:
+                break
+            view = memoryview(data)
+            for start in range(0, len(view), BLOCK_SIZE):
+                block = new_digest()
+                block.update(view[start:start + BLOCK_SIZE])
+                digest.update(block.digest())
+    return digest.hexdigest()
+
+
+class ContentIndex:
+    """Digests of uploaded files, saved to a JSON file (temp file + rename)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.entries = {}
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text())
+            except ValueError:
+                pass  # Corrupt index: start over, the server has its own
+
+    def __contains__(self, digest: str) -> bool:
+        with self.lock:
+            return digest in self.entries
+
+    def known_digest(self, path: Path) -> str:
+        """Digest of an uploaded file that is unchanged (name, size, mtime), or None."""
+        stat = path.stat()
+        with self.lock:
+            for digest, entry in self.entries.items():
+                if (entry.get("scheme") == DIGEST_SCHEME and entry["filename"] == path.name
+                        and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns):
+                    return digest
+        return None
+
+    def add(self, digest: str, path: Path):
+        stat = path.stat()
+        with self.lock:
+            self.entries[digest] = {
+                "filename": path.name,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "scheme": DIGEST_SCHEME,
+                "uploaded_at": datetime.now().isoformat()
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self.entries))
+            os.replace(tmp_path, self.path)
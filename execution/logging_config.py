@@ -73,6 +73,10 @@ class VideoHistoryLogger:
         """Log upload failure."""
         self._write_entry("upload_failed", filename=filename, error=error)
     
+    def log_duplicate_skipped(self, filename: str, digest: str, state: str):
+        """Log a queued video skipped because its content was already uploaded."""
+        self._write_entry("duplicate_skipped", filename=filename, digest=digest, state=state)
+    
     def log_telegram_sent(self, filename: str, message_id: int, chat_id: int):
         """Log when Telegram preview message is sent."""
         self._write_entry(
@@ -0,0 +1,130 @@
+"""
+Queue directory watching for the iCloud watcher.
+
+Provides:
+- PollingWatcher: rescans the directory every few seconds (works everywhere)
+- InotifyWatcher: Linux inotify via ctypes; blocks until files are finished
+  being written (IN_CLOSE_WRITE) or moved in (IN_MOVED_TO)
+- create_watcher(): picks inotify when available, else polling
+
+Both report changes through ``wait(timeout) -> (ready, removed)``: paths that
+appeared or finished writing, and paths that were deleted or moved away.
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from pathlib import Path
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len (name follows)
+
+
+class PollingWatcher:
+    """Detects changes by listing the directory every ``interval`` seconds."""
+
+    def __init__(self, directory: Path, interval: float = 3):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.known = set()
+
+    def scan(self) -> set:
+        """All current entries; they count as seen from now on."""
+        self.known = set(self.directory.iterdir())
+        return set(self.known)
+
+    def wait(self, timeout: float = None) -> tuple:
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        current = set(self.directory.iterdir())
+        ready, removed = current - self.known, self.known - current
+        self.known = current
+        return ready, removed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Blocks on inotify events for the directory; no wakeups while idle."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(self.directory), WATCH_MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed for {self.directory}")
+
+    def scan(self) -> set:
+        """All current entries (events only report later changes)."""
+        return set(self.directory.iterdir())
+
+    def wait(self, timeout: float = None) -> tuple:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set(), set()
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set(), set()
+
+        ready, removed = set(), set()
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; report everything and let the caller dedupe
+                ready |= self.scan()
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                raise FileNotFoundError(f"Watched directory went away: {self.directory}")
+            elif name:
+                path = self.directory / os.fsdecode(name)
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    ready.add(path)
+                    removed.discard(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    removed.add(path)
+                    ready.discard(path)
+        return ready, removed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(directory: Path, backend: str = "auto", poll_interval: float = 3):
+    """Return an InotifyWatcher on Linux (unless backend="poll"), else a PollingWatcher."""
+    if backend in ("auto", "inotify") and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory)
+        except OSError:
+            if backend == "inotify":
+                raise
+    return PollingWatcher(directory, poll_interval)
@@ -8,13 +8,16 @@ and uploads them to the Railway server with Telegram preview notifications.
 
 import os
 import sys
+import json
 import time
-import shutil
 import hashlib
+import threading
 import subprocess
 import requests
 from pathlib import Path
 from datetime import datetime
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
@@ -22,6 +25,9 @@ from urllib3.util.retry import Retry
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 from logging_config import setup_watcher_logging, log_exception
+from queue_watch import create_watcher
+from archive_copy import TIERS, TeeArchive, copy_file
+from content_index import BLOCK_SIZE, ContentIndex, file_digest, new_digest
 
 # Load environment variables
 load_dotenv()
@@ -32,9 +38,17 @@ VIDEO_QUEUE_PATH = os.path.expanduser(
     os.getenv("VIDEO_QUEUE_PATH", "~/Library/Mobile Documents/com~apple~CloudDocs/VideoQueue_v2")
 )
 LOCAL_ARCHIVE_PATH = os.path.expanduser("~/Local Documents/YT Video Archive")
+# Archive copy methods to try, cheapest first (see archive_copy.py)
+ARCHIVE_METHODS = os.getenv("ARCHIVE_METHODS", "reflink,hardlink,copy_file_range,copy").split(",")
+# "copy": archive with the methods above before deleting from the queue
+# "tee": write the archive from the upload's own chunk reads (the content
+#        digest still reads a new file once beforehand)
+ARCHIVE_MODE = os.getenv("ARCHIVE_MODE", "copy")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_USER_ID = os.getenv("TELEGRAM_USER_ID")
-POLL_INTERVAL = 3  # seconds
+POLL_INTERVAL = 3  # seconds (polling backend only)
+DEFER_INTERVAL = 60  # seconds before a deferred duplicate is looked at again
+WATCH_BACKEND = os.getenv("WATCH_BACKEND", "auto")  # "auto" (inotify on Linux), "inotify" or "poll"
 VIDEO_EXTENSIONS = {".mov", ".mp4", ".m4v", ".avi", ".mkv"}
 
 # Chunk sizes based on file size
@@ -42,9 +56,41 @@ CHUNK_SIZE_SMALL = 15 * 1024 * 1024   # 15MB for files < 100MB
 CHUNK_SIZE_MEDIUM = 25 * 1024 * 1024  # 25MB for files 100MB-1GB
 CHUNK_SIZE_LARGE = 50 * 1024 * 1024   # 50MB for files > 1GB
 
+# Chunk sizing: "adaptive" tunes the size from measured throughput, RTT and
+# errors (AIMD, learned size kept in WATCHER_STATE_DIR); "fixed" uses the
+# size classes above
+CHUNK_SIZE_MODE = os.getenv("CHUNK_SIZE_MODE", "adaptive")
+CHUNK_MIN_MB = int(os.getenv("CHUNK_MIN_MB", "4"))
+CHUNK_MAX_MB = int(os.getenv("CHUNK_MAX_MB", "100"))  # each chunk is held in memory
+CHUNK_STEP_MB = int(os.getenv("CHUNK_STEP_MB", "5"))  # additive increase per fast chunk
+CHUNK_TARGET_SECONDS = float(os.getenv("CHUNK_TARGET_SECONDS", "20"))  # well inside the 120s timeout
+CHUNK_RTT_OVERHEAD = 0.1  # keep chunks big enough that round trips cost < 10%
+
+# Concurrent chunk uploads per file (1 = serial, in-order protocol)
+UPLOAD_PARALLELISM = int(os.getenv("UPLOAD_PARALLELISM", "1"))
+
+# Watcher pipeline: worker threads per stage. Uploads share the uplink, so
+# keep that pool small.
+PROBE_WORKERS = int(os.getenv("PROBE_WORKERS", "4"))
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", "2"))
+ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", "2"))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+
+# Watcher state (content index); relative to the working directory like logs/
+WATCHER_STATE_DIR = Path(os.getenv("WATCHER_STATE_DIR", "state"))
+
+# Preset title ("{stem}" = filename without extension) and privacy. With both
+# set the server skips the Telegram questions and, for landscape videos,
+# starts the YouTube upload while chunks are still arriving.
+PRESET_TITLE = os.getenv("PRESET_TITLE", "")
+PRESET_PRIVACY = os.getenv("PRESET_PRIVACY", "")
+
 # Initialize logging
 logger, history = setup_watcher_logging()
 
+# Digests of content already uploaded by this watcher
+content_index = ContentIndex(WATCHER_STATE_DIR / "content_index.json")
+
 
 def create_session():
     """Create a requests session with retry strategy."""
@@ -71,6 +117,96 @@ def get_chunk_size(file_size: int) -> int:
         return CHUNK_SIZE_LARGE
 
 
+class ChunkSizeController:
+    """AIMD chunk sizing from measured upload throughput, RTT and errors.
+    
+    Each chunk that finishes within CHUNK_TARGET_SECONDS grows the size by
+    CHUNK_STEP_MB; a failed chunk, or one taking over twice the target,
+    halves it. The size never drops below what keeps round trips under
+    CHUNK_RTT_OVERHEAD of the transfer time. Sizes are read at dispatch time,
+    so concurrent uploads and parallel chunks all follow the current value.
+    The learned size is saved to ``path`` and used as the next run's start.
+    """
+    
+    def __init__(self, path: Path, adaptive: bool = True):
+        self.path = Path(path)
+        self.adaptive = adaptive
+        self.lock = threading.Lock()
+        self.chunk_size = CHUNK_SIZE_MEDIUM
+        self.throughput = None  # bytes/second, EWMA
+        self.rtt = None  # seconds, EWMA
+        if adaptive and self.path.exists():
+            try:
+                saved = json.loads(self.path.read_text())
+                self.chunk_size = saved["chunk_size"]
+                self.throughput = saved.get("throughput")
+                self.rtt = saved.get("rtt")
+            except (ValueError, KeyError):
+                pass
+        self.chunk_size = self._clamp(self.chunk_size)
+    
+    def size(self, file_size: int) -> int:
+        """Size for the next chunk of a file."""
+        if not self.adaptive:
+            return get_chunk_size(file_size)
+        with self.lock:
+            return self.chunk_size
+    
+    def record(self, sent: int, elapsed: float):
+        """A chunk of ``sent`` bytes was accepted after ``elapsed`` seconds."""
+        if not self.adaptive or elapsed <= 0:
+            return
+        with self.lock:
+            rate = sent / elapsed
+            self.throughput = rate if self.throughput is None else 0.8 * self.throughput + 0.2 * rate
+            if elapsed > CHUNK_TARGET_SECONDS * 2:
+                self.chunk_size //= 2
+            elif elapsed < CHUNK_TARGET_SECONDS:
+                self.chunk_size += CHUNK_STEP_MB * 1024 * 1024
+            if self.rtt:
+                self.chunk_size = max(self.chunk_size, int(self.throughput * self.rtt / CHUNK_RTT_OVERHEAD))
+            self.chunk_size = self._clamp(self.chunk_size)
+    
+    def record_failure(self):
+        """A chunk failed or timed out."""
+        if not self.adaptive:
+            return
+        with self.lock:
+            self.chunk_size = self._clamp(self.chunk_size // 2)
+    
+    def record_rtt(self, rtt: float):
+        """Duration of a bodiless request (upload status check)."""
+        with self.lock:
+            self.rtt = rtt if self.rtt is None else 0.8 * self.rtt + 0.2 * rtt
+    
+    def save(self):
+        if not self.adaptive:
+            return
+        with self.lock:
+            state = {"chunk_size": self.chunk_size, "throughput": self.throughput, "rtt": self.rtt}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state))
+        os.replace(tmp_path, self.path)
+    
+    def _clamp(self, size: int) -> int:
+        # Whole content-digest blocks, so the server can check the file from its chunks
+        size = size // BLOCK_SIZE * BLOCK_SIZE
+        return max(CHUNK_MIN_MB * 1024 * 1024, min(size, CHUNK_MAX_MB * 1024 * 1024))
+
+
+chunk_sizer = ChunkSizeController(WATCHER_STATE_DIR / "chunk_size.json", CHUNK_SIZE_MODE == "adaptive")
+
+
+def log_upload_complete(filename: str, sent: int, duration: float, file_size: int):
+    """Log a finished upload with its effective throughput."""
+    mb_per_s = sent / 1024 / 1024 / duration if duration > 0 else 0
+    logger.info(f"Upload complete: {filename} ({duration:.1f}s, {mb_per_s:.1f} MB/s, "
+                f"next chunk {chunk_sizer.size(file_size) / 1024 / 1024:.0f} MB)")
+    history.log_upload_complete(filename, duration)
+    chunk_sizer.save()
+
+
 def is_icloud_placeholder(path: Path) -> bool:
     """Check if file is an iCloud placeholder (not downloaded)."""
     # Check for .icloud prefix file
@@ -117,59 +253,61 @@ def wait_for_file_stability(path: Path) -> bool:
 
 
 def get_video_metadata(path: Path) -> dict:
-    """Extract video metadata using ffprobe."""
-    metadata = {"duration": None, "creation_time": None, "width": 0, "height": 0}
+    """Extract video metadata with a single ffprobe pass.
+    
+    width/height are the coded dimensions of the first video stream and
+    rotation its display rotation (degrees counter-clockwise), as the server
+    uses them to decide on rotating portrait videos.
+    """
+    metadata = {
+        "duration": None, "creation_time": None, "width": 0, "height": 0,
+        "rotation": 0, "codec": None, "bitrate": None
+    }
     
     try:
-        # Get duration and dimensions
         result = subprocess.run(
-            [
-                "ffprobe", "-v", "quiet",
-                "-show_entries", "format=duration:stream=width,height",
-                "-of", "json",
-                str(path)
-            ],
+            ["ffprobe", "-v", "quiet", "-show_format", "-show_streams", "-of", "json", str(path)],
             capture_output=True,
             text=True,
             timeout=30
         )
+        if result.returncode != 0:
+            return metadata
         
-        if result.returncode == 0:
-            import json
-            data = json.loads(result.stdout)
-            
-            # Duration
-            if "format" in data and "duration" in data["format"]:
-                duration_sec = float(data["format"]["duration"])
-                minutes = int(duration_sec // 60)
-                seconds = int(duration_sec % 60)
-                metadata["duration"] = f"{minutes}:{seconds:02d}"
-                metadata["duration_sec"] = duration_sec
-            
-            # Dimensions
-            if "streams" in data:
-                for stream in data["streams"]:
-                    if "width" in stream and "height" in stream:
-                        metadata["width"] = stream["width"]
-                        metadata["height"] = stream["height"]
-                        break
+        data = json.loads(result.stdout)
+        fmt = data.get("format", {})
         
-        # Get creation time
-        result = subprocess.run(
-            [
-                "ffprobe", "-v", "quiet",
-                "-show_entries", "format_tags=creation_time",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                str(path)
-            ],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        # Duration
+        if "duration" in fmt:
+            duration_sec = float(fmt["duration"])
+            minutes = int(duration_sec // 60)
+            seconds = int(duration_sec % 60)
+            metadata["duration"] = f"{minutes}:{seconds:02d}"
+            metadata["duration_sec"] = duration_sec
+        
+        if fmt.get("bit_rate"):
+            metadata["bitrate"] = int(fmt["bit_rate"])
         
-        if result.returncode == 0 and result.stdout.strip():
+        # Dimensions, codec and rotation of the first video stream
+        for stream in data.get("streams", []):
+            if stream.get("codec_type") == "video":
+                metadata["width"] = stream.get("width", 0)
+                metadata["height"] = stream.get("height", 0)
+                metadata["codec"] = stream.get("codec_name")
+                for side_data in stream.get("side_data_list", []):
+                    if "rotation" in side_data:
+                        metadata["rotation"] = int(side_data["rotation"])
+                        break
+                else:
+                    # Legacy rotate tag is clockwise
+                    metadata["rotation"] = -int(stream.get("tags", {}).get("rotate", 0))
+                break
+        
+        # Creation time
+        creation_time = fmt.get("tags", {}).get("creation_time")
+        if creation_time:
             try:
-                dt = datetime.fromisoformat(result.stdout.strip().replace("Z", "+00:00"))
+                dt = datetime.fromisoformat(creation_time.replace("Z", "+00:00"))
                 # Format as "January 1st, 2025 at 2:00 PM"
                 day = dt.day
                 suffix = "th" if 11 <= day <= 13 else {1: "st", 2: "nd", 3: "rd"}.get(day % 10, "th")
@@ -241,8 +379,8 @@ def send_telegram_preview(filename: str, thumbnail_path: Path) -> int:
         return None
 
 
-def archive_locally(video_path: Path) -> Path:
-    """Copy video to local archive folder, handling duplicates."""
+def archive_destination(video_path: Path) -> Path:
+    """Path in the local archive folder for a video, handling duplicates."""
     archive_dir = Path(LOCAL_ARCHIVE_PATH)
     archive_dir.mkdir(parents=True, exist_ok=True)
     
@@ -254,33 +392,257 @@ def archive_locally(video_path: Path) -> Path:
         stem = video_path.stem
         suffix = video_path.suffix
         dest_path = archive_dir / f"{stem}_{timestamp}{suffix}"
+    return dest_path
+
+
+def archived_copy(video_path: Path) -> Path:
+    """A video's archive copy under its own name, if it has the same size."""
+    dest_path = Path(LOCAL_ARCHIVE_PATH) / video_path.name
+    try:
+        if dest_path.stat().st_size == video_path.stat().st_size:
+            return dest_path
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def archive_locally(video_path: Path) -> Path:
+    """Copy video to local archive folder, handling duplicates.
     
-    shutil.copy2(video_path, dest_path)
-    logger.info(f"Archived locally: {dest_path.name}")
+    Uses a clone, hardlink or in-kernel copy where possible (ARCHIVE_METHODS)
+    so the video's bytes are usually not read at all.
+    """
+    dest_path = archive_destination(video_path)
+    tiers = tuple(tier for tier in TIERS if tier[0] in ARCHIVE_METHODS)
+    start = time.time()
+    method = copy_file(video_path, dest_path, tiers)
+    logger.info(f"Archived locally: {dest_path.name} ({method}, {time.time() - start:.1f}s)")
     return dest_path
 
 
-def get_upload_status(session: requests.Session, filename: str) -> int:
-    """Check current upload offset from server."""
+def upload_status_params(filename: str, digest: str = None) -> dict:
+    """/upload_status query; with the digest the server reports a file it already has."""
+    params = {"filename": filename}
+    if digest:
+        params["digest"] = digest
+    return params
+
+
+def get_upload_status(session: requests.Session, filename: str, file_size: int, digest: str = None) -> int:
+    """Check current upload offset from server (file_size if it already has the file)."""
     try:
+        start = time.perf_counter()
         response = session.get(
             f"{RAILWAY_URL}/upload_status",
-            params={"filename": filename},
+            params=upload_status_params(filename, digest),
             timeout=30
         )
+        chunk_sizer.record_rtt(time.perf_counter() - start)
         if response.ok:
-            return response.json().get("offset", 0)
+            data = response.json()
+            if data.get("status") == "complete":
+                return file_size
+            return data.get("offset", 0)
     except Exception as e:
         logger.debug(f"Could not get upload status: {e}")
     return 0
 
 
+def get_missing_ranges(session: requests.Session, filename: str, file_size: int, digest: str = None) -> list:
+    """Ask the server which byte ranges of a file it has not received yet."""
+    try:
+        start = time.perf_counter()
+        response = session.get(
+            f"{RAILWAY_URL}/upload_status",
+            params=upload_status_params(filename, digest),
+            timeout=30
+        )
+        chunk_sizer.record_rtt(time.perf_counter() - start)
+        if response.ok:
+            data = response.json()
+            if "missing" in data:
+                return data["missing"]
+            return [[data.get("offset", 0), file_size]]
+    except Exception as e:
+        logger.debug(f"Could not get upload status: {e}")
+    return [[0, file_size]]
+
+
+def iter_chunks(ranges: list, file_size: int):
+    """Yield (offset, length) chunks covering [start, end) ranges.
+    
+    Each length is taken from chunk_sizer when the chunk is dispatched.
+    """
+    for start, end in ranges:
+        offset = start
+        while offset < end:
+            length = min(chunk_sizer.size(file_size), end - offset)
+            yield offset, length
+            offset += length
+
+
+def chunk_digest(chunk: bytes) -> str:
+    """Hex BLAKE2b of one chunk, checked by the server as it streams the chunk in."""
+    digest = new_digest()
+    digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_chunk_headers(filename: str, file_size: int, offset: int,
+                        metadata: dict, message_id: int, chunk: bytes) -> dict:
+    """Build the request headers for one /upload_chunk call."""
+    headers = {
+        "X-Filename": filename,
+        "X-Total-Size": str(file_size),
+        "X-Offset": str(offset),
+        "X-Chunk-Digest": chunk_digest(chunk),
+        "X-Video-Duration": metadata.get("duration") or "",
+        "X-Video-Creation-Time": metadata.get("creation_time") or "",
+        "Content-Type": "application/octet-stream"
+    }
+    if message_id:
+        headers["X-Message-Id"] = str(message_id)
+    # Probe results, so the server never has to run ffprobe itself
+    if metadata.get("width") and metadata.get("height"):
+        headers["X-Video-Width"] = str(metadata["width"])
+        headers["X-Video-Height"] = str(metadata["height"])
+        headers["X-Video-Rotation"] = str(metadata.get("rotation") or 0)
+    if metadata.get("duration_sec"):
+        headers["X-Video-Duration-Seconds"] = f"{metadata['duration_sec']:.3f}"
+    if metadata.get("codec"):
+        headers["X-Video-Codec"] = metadata["codec"]
+    if metadata.get("bitrate"):
+        headers["X-Video-Bitrate"] = str(metadata["bitrate"])
+    if metadata.get("digest"):
+        headers["X-Content-Digest"] = metadata["digest"]
+    if PRESET_TITLE and PRESET_PRIVACY:
+        title = PRESET_TITLE.replace("{stem}", Path(filename).stem)
+        headers["X-Video-Title"] = quote(title)  # headers must be latin-1
+        headers["X-Video-Privacy"] = PRESET_PRIVACY
+    return headers
+
+
+def upload_video_parallel(video_path: Path, metadata: dict, message_id: int,
+                          tee: TeeArchive = None) -> bool:
+    """Upload video chunks concurrently; the server writes each at its offset.
+    
+    Only the ranges the server reports as missing are sent, so a resume
+    re-sends just the holes left by failed chunks.
+    """
+    filename = video_path.name
+    file_size = video_path.stat().st_size
+    
+    logger.info(f"Starting parallel upload: {filename} ({file_size / 1024 / 1024:.1f} MB, "
+                f"{UPLOAD_PARALLELISM} streams)")
+    history.log_upload_started(filename, RAILWAY_URL)
+    
+    start_time = time.time()
+    local = threading.local()
+    progress_lock = threading.Lock()
+    chunks_sent = 0
+    bytes_sent = 0
+    
+    def send_chunk(fd: int, offset: int, length: int) -> dict:
+        nonlocal chunks_sent, bytes_sent
+        if not hasattr(local, "session"):
+            local.session = create_session()
+        
+        chunk = os.pread(fd, length, offset)
+        if tee:
+            tee.write(offset, chunk)
+        
+        max_retries = 3
+        for attempt in range(max_retries):
+            headers = build_chunk_headers(filename, file_size, offset, metadata, message_id, chunk)
+            headers["X-Upload-Mode"] = "parallel"
+            try:
+                sent_at = time.perf_counter()
+                response = local.session.post(
+                    f"{RAILWAY_URL}/upload_chunk",
+                    data=chunk,
+                    headers=headers,
+                    timeout=120
+                )
+                if response.ok:
+                    elapsed = time.perf_counter() - sent_at
+                    data = response.json()
+                    if data.get("status") != "complete":
+                        # The completing chunk's time includes the server's verification
+                        chunk_sizer.record(length, elapsed)
+                    with progress_lock:
+                        chunks_sent += 1
+                        bytes_sent += length
+                        history.log_upload_progress(
+                            filename, data.get("offset", offset + length), file_size, chunks_sent
+                        )
+                    return data
+                logger.error(f"Chunk at {offset} failed: {response.status_code} - {response.text}")
+                if response.status_code == 422:
+                    data = response.json()
+                    if data.get("status") == "rejected":
+                        return data  # Whole file failed verification
+                    # Corrupted on the way: read it again and resend just this chunk
+                    chunk = os.pread(fd, length, offset)
+                else:
+                    chunk_sizer.record_failure()
+            except requests.RequestException as e:
+                logger.error(f"Chunk at {offset} failed (attempt {attempt + 1}): {e}")
+                chunk_sizer.record_failure()
+            if attempt < max_retries - 1:
+                time.sleep(2 ** attempt)  # Exponential backoff
+        return None
+    
+    session = create_session()
+    with open(video_path, "rb") as f:
+        for round_number in range(3):
+            missing = get_missing_ranges(session, filename, file_size, metadata.get("digest"))
+            if not missing:
+                # Complete already; the response to the last chunk was lost
+                log_upload_complete(filename, bytes_sent, time.time() - start_time, file_size)
+                return True
+            if round_number > 0:
+                logger.warning(f"Re-sending {len(missing)} missing range(s) of {filename}")
+            
+            # Streams pull the next chunk when free, sized at that moment
+            chunks = iter_chunks(missing, file_size)
+            chunks_lock = threading.Lock()
+            
+            def stream() -> list:
+                results = []
+                while True:
+                    with chunks_lock:
+                        chunk = next(chunks, None)
+                    if chunk is None:
+                        return results
+                    results.append(send_chunk(f.fileno(), *chunk))
+            
+            with ThreadPoolExecutor(max_workers=UPLOAD_PARALLELISM) as pool:
+                streams = [pool.submit(stream) for _ in range(UPLOAD_PARALLELISM)]
+                results = [result for future in streams for result in future.result()]
+            
+            if any(r and r.get("status") == "rejected" for r in results):
+                # The file changed since it was probed; retrying can't help
+                logger.error(f"Server rejected {filename}: content digest mismatch")
+                return False
+            
+            if any(r and r.get("status") == "complete" for r in results):
+                log_upload_complete(filename, bytes_sent, time.time() - start_time, file_size)
+                return True
+    
+    return False
+
+
 def upload_video_chunked(session: requests.Session, video_path: Path, 
-                          metadata: dict, message_id: int) -> bool:
-    """Upload video in chunks with resume support."""
+                          metadata: dict, message_id: int, tee: TeeArchive = None) -> bool:
+    """Upload video in chunks with resume support.
+    
+    Every chunk read is also handed to ``tee`` when given.
+    """
+    if UPLOAD_PARALLELISM > 1:
+        return upload_video_parallel(video_path, metadata, message_id, tee)
+    
     filename = video_path.name
     file_size = video_path.stat().st_size
-    chunk_size = get_chunk_size(file_size)
     
     logger.info(f"Starting chunked upload: {filename} ({file_size / 1024 / 1024:.1f} MB)")
     history.log_upload_started(filename, RAILWAY_URL)
@@ -289,35 +651,28 @@ def upload_video_chunked(session: requests.Session, video_path: Path,
     
     with open(video_path, "rb") as f:
         # Get current offset (for resume)
-        offset = get_upload_status(session, filename)
+        offset = get_upload_status(session, filename, file_size, metadata.get("digest"))
         if offset > 0:
             logger.info(f"Resuming upload from offset {offset}")
             f.seek(offset)
         
         chunk_number = 0
+        bytes_sent = 0
         while True:
-            chunk = f.read(chunk_size)
+            chunk = f.read(chunk_sizer.size(file_size))
             if not chunk:
                 break
             
             chunk_number += 1
             current_offset = f.tell() - len(chunk)
-            
-            headers = {
-                "X-Filename": filename,
-                "X-Total-Size": str(file_size),
-                "X-Offset": str(current_offset),
-                "X-Video-Duration": metadata.get("duration", ""),
-                "X-Video-Creation-Time": metadata.get("creation_time", ""),
-                "Content-Type": "application/octet-stream"
-            }
-            
-            if message_id:
-                headers["X-Message-Id"] = str(message_id)
+            if tee:
+                tee.write(current_offset, chunk)
             
             max_retries = 3
             for attempt in range(max_retries):
+                headers = build_chunk_headers(filename, file_size, current_offset, metadata, message_id, chunk)
                 try:
+                    sent_at = time.perf_counter()
                     response = session.post(
                         f"{RAILWAY_URL}/upload_chunk",
                         data=chunk,
@@ -332,24 +687,42 @@ def upload_video_chunked(session: requests.Session, video_path: Path,
                         f.seek(new_offset)
                         break
                     
+                    if response.status_code == 422:
+                        if response.json().get("status") == "rejected":
+                            # Whole-file digest mismatch: the file changed since it was probed
+                            logger.error(f"Server rejected {filename}: {response.text}")
+                            return False
+                        # Corrupted on the way: read it again and resend just this chunk
+                        logger.warning(f"Chunk at {current_offset} failed verification, resending")
+                        f.seek(current_offset)
+                        chunk = f.read(len(chunk))
+                        f.seek(current_offset + len(chunk))
+                        if attempt == max_retries - 1:
+                            return False
+                        continue
+                    
                     if response.ok:
+                        elapsed = time.perf_counter() - sent_at
                         data = response.json()
-                        bytes_sent = current_offset + len(chunk)
-                        history.log_upload_progress(filename, bytes_sent, file_size, chunk_number)
+                        if data.get("status") != "complete":
+                            # The completing chunk's time includes the server's verification
+                            chunk_sizer.record(len(chunk), elapsed)
+                        bytes_sent += len(chunk)
+                        history.log_upload_progress(filename, current_offset + len(chunk), file_size, chunk_number)
                         
                         if data.get("status") == "complete":
-                            duration = time.time() - start_time
-                            logger.info(f"Upload complete: {filename} ({duration:.1f}s)")
-                            history.log_upload_complete(filename, duration)
+                            log_upload_complete(filename, bytes_sent, time.time() - start_time, file_size)
                             return True
                         break
                     else:
                         logger.error(f"Upload error: {response.status_code} - {response.text}")
+                        chunk_sizer.record_failure()
                         if attempt == max_retries - 1:
                             return False
                 
                 except requests.RequestException as e:
                     logger.error(f"Upload request failed (attempt {attempt + 1}): {e}")
+                    chunk_sizer.record_failure()
                     if attempt == max_retries - 1:
                         return False
                     time.sleep(2 ** attempt)  # Exponential backoff
@@ -357,59 +730,225 @@ def upload_video_chunked(session: requests.Session, video_path: Path,
     return True
 
 
-def process_video(video_path: Path, session: requests.Session):
-    """Process a single video file."""
+def upload_with_tee(session: requests.Session, video_path: Path,
+                    metadata: dict, message_id: int) -> bool:
+    """Upload a video and build its archive copy from the same reads."""
+    tee = TeeArchive(video_path, archive_destination(video_path))
+    try:
+        uploaded = upload_video_chunked(session, video_path, metadata, message_id, tee)
+    except Exception:
+        tee.abort()
+        raise
+    
+    if not uploaded:
+        tee.abort()
+    elif tee.finish():
+        logger.info(f"Archived locally: {tee.dest.name} (tee)")
+    else:
+        # Resumed upload: the part the server already had was never read
+        logger.info(f"Tee archive of {video_path.name} incomplete, copying instead")
+        archive_locally(video_path)
+    return uploaded
+
+
+def probe_video(video_path: Path) -> dict:
+    """Make sure a queued video is local and complete; return its metadata or None."""
     filename = video_path.name
     logger.info(f"Processing video: {filename}")
     
+    # Check if iCloud placeholder
+    if is_icloud_placeholder(video_path):
+        if not download_from_icloud(video_path):
+            logger.error(f"Failed to download from iCloud: {filename}")
+            return None
+    
+    # Wait for file stability
+    if not wait_for_file_stability(video_path):
+        logger.debug(f"File not stable yet: {filename}")
+        return None
+    
+    # Get video metadata and content digest
+    metadata = get_video_metadata(video_path)
+    metadata["digest"] = content_index.known_digest(video_path) or file_digest(video_path)
+    size_mb = video_path.stat().st_size / (1024 * 1024)
+    
+    history.log_video_detected(
+        filename=filename,
+        path=str(video_path),
+        size_mb=round(size_mb, 2),
+        duration=metadata.get("duration"),
+        creation_time=metadata.get("creation_time")
+    )
+    return metadata
+
+
+def get_content_state(session: requests.Session, digest: str) -> str:
+    """Ask the server whether it holds this content: "received", "published" or None.
+    
+    Raises requests.RequestException if the server can't be reached.
+    """
+    response = session.head(f"{RAILWAY_URL}/content/{digest}", timeout=30)
+    if response.status_code == 200:
+        return response.headers.get("X-Content-State", "received")
+    return None
+
+
+def skip_duplicate(session: requests.Session, video_path: Path, digest: str) -> str:
+    """Drop a queued video whose content was already uploaded.
+    
+    Returns "skipped" if it was dropped, "deferred" if it should be looked
+    at again later, or None to upload it. The server's content index
+    decides, and the queue copy is only deleted once the archive has a
+    copy. When the server can't be reached, a video in this watcher's own
+    index is deferred and stays in the queue.
+    """
     try:
-        # Check if iCloud placeholder
-        if is_icloud_placeholder(video_path):
-            if not download_from_icloud(video_path):
-                logger.error(f"Failed to download from iCloud: {filename}")
-                return
-        
-        # Wait for file stability
-        if not wait_for_file_stability(video_path):
-            logger.debug(f"File not stable yet: {filename}")
-            return
-        
-        # Get video metadata
-        metadata = get_video_metadata(video_path)
-        size_mb = video_path.stat().st_size / (1024 * 1024)
-        
-        history.log_video_detected(
-            filename=filename,
-            path=str(video_path),
-            size_mb=round(size_mb, 2),
-            duration=metadata.get("duration"),
-            creation_time=metadata.get("creation_time")
-        )
-        
-        # Generate thumbnail
-        thumbnail_path = video_path.with_suffix(".jpg")
-        message_id = None
-        
-        if generate_thumbnail(video_path, thumbnail_path):
-            message_id = send_telegram_preview(filename, thumbnail_path)
-            # Clean up thumbnail
-            thumbnail_path.unlink(missing_ok=True)
-        
-        # Archive locally before upload
+        state = get_content_state(session, digest)
+    except requests.RequestException as e:
+        if digest in content_index:
+            logger.info(f"Deferring {video_path.name}: uploaded before, server unreachable ({e})")
+            return "deferred"
+        logger.debug(f"Could not check content digest: {e}")
+        return None
+    
+    if not state:
+        return None
+    if not archived_copy(video_path):
         archive_locally(video_path)
+    video_path.unlink()
+    logger.info(f"Skipped duplicate: {video_path.name} ({state}, digest {digest[:12]})")
+    history.log_duplicate_skipped(video_path.name, digest, state)
+    return "skipped"
+
+
+def send_preview(video_path: Path) -> int:
+    """Send the thumbnail preview to Telegram; return its message_id (or None)."""
+    thumbnail_path = video_path.with_suffix(".jpg")
+    message_id = None
+    
+    if generate_thumbnail(video_path, thumbnail_path):
+        message_id = send_telegram_preview(video_path.name, thumbnail_path)
+        # Clean up thumbnail
+        thumbnail_path.unlink(missing_ok=True)
+    return message_id
+
+
+def finish_video(video_path: Path, uploaded: bool, digest: str = None):
+    """Delete an uploaded (and archived) video from the queue, or record the failure."""
+    filename = video_path.name
+    if uploaded:
+        if digest:
+            content_index.add(digest, video_path)
+        # Delete from queue after successful upload
+        video_path.unlink()
+        logger.info(f"Deleted from queue: {filename}")
+    else:
+        history.log_upload_failed(filename, "Upload failed after retries")
+        logger.error(f"Failed to upload: {filename}")
+
+
+class VideoPipeline:
+    """Runs queued videos through probe, preview, archive and upload stages.
+    
+    Each stage has its own bounded thread pool, so one file can upload while
+    the next is probed and another archived. A file's archive copy and its
+    Telegram preview run side by side; the upload waits for the preview
+    (its message_id goes with the chunks) and the queue copy is deleted
+    only once both the upload and the archive have succeeded. In tee mode
+    the upload writes the archive copy itself and there is no archive stage.
+    
+    A digest is claimed while its file is in flight, so a second copy of the
+    same clip queued alongside waits (DEFER_INTERVAL) and is then skipped as
+    a duplicate, instead of both copies probing at once and uploading.
+    """
+    
+    def __init__(self):
+        self.probe_pool = ThreadPoolExecutor(PROBE_WORKERS, thread_name_prefix="probe")
+        self.preview_pool = ThreadPoolExecutor(PREVIEW_WORKERS, thread_name_prefix="preview")
+        self.archive_pool = ThreadPoolExecutor(ARCHIVE_WORKERS, thread_name_prefix="archive")
+        self.upload_pool = ThreadPoolExecutor(UPLOAD_WORKERS, thread_name_prefix="upload")
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.in_flight = {}  # digest -> path of the video being uploaded with it
+    
+    def submit(self, video_path: Path):
+        return self.probe_pool.submit(self._stage, self._probe, video_path)
+    
+    def shutdown(self):
+        """Wait for every submitted video to finish all stages."""
+        # Stages feed the next pool, so drain them in order
+        for pool in (self.probe_pool, self.preview_pool, self.archive_pool, self.upload_pool):
+            pool.shutdown(wait=True)
+    
+    def _stage(self, func, video_path: Path, *args):
+        try:
+            func(video_path, *args)
+        except Exception as e:
+            self._release(video_path)
+            log_exception(logger, f"Error processing {video_path.name}", e)
+            history.log_upload_failed(video_path.name, str(e))
+    
+    def _claim(self, video_path: Path, digest: str) -> bool:
+        """Claim a digest for this video; False if another queued copy holds it."""
+        with self.lock:
+            if self.in_flight.setdefault(digest, video_path) != video_path:
+                return False
+            return True
+    
+    def _release(self, video_path: Path):
+        with self.lock:
+            for digest, path in list(self.in_flight.items()):
+                if path == video_path:
+                    del self.in_flight[digest]
+    
+    def _defer(self, video_path: Path):
+        """Look at a video again later, if it is still queued then."""
+        def resubmit():
+            if video_path.exists():
+                self.submit(video_path)
         
-        # Upload to server
-        if upload_video_chunked(session, video_path, metadata, message_id):
-            # Delete from queue after successful upload
-            video_path.unlink()
-            logger.info(f"Deleted from queue: {filename}")
-        else:
-            history.log_upload_failed(filename, "Upload failed after retries")
-            logger.error(f"Failed to upload: {filename}")
+        timer = threading.Timer(DEFER_INTERVAL, resubmit)
+        timer.daemon = True
+        timer.start()
     
-    except Exception as e:
-        log_exception(logger, f"Error processing {filename}", e)
-        history.log_upload_failed(filename, str(e))
+    def _session(self) -> requests.Session:
+        if not hasattr(self.local, "session"):
+            self.local.session = create_session()
+        return self.local.session
+    
+    def _probe(self, video_path: Path):
+        metadata = probe_video(video_path)
+        if metadata is None:
+            return
+        if not self._claim(video_path, metadata["digest"]):
+            logger.info(f"Deferring {video_path.name}: a copy with the same content is in flight")
+            self._defer(video_path)
+            return
+        skipped = skip_duplicate(self._session(), video_path, metadata["digest"])
+        if skipped:
+            self._release(video_path)
+            if skipped == "deferred":
+                self._defer(video_path)
+            return
+        archived = None
+        if ARCHIVE_MODE != "tee":
+            archived = self.archive_pool.submit(archive_locally, video_path)
+        self.preview_pool.submit(self._stage, self._preview, video_path, metadata, archived)
+    
+    def _preview(self, video_path: Path, metadata: dict, archived):
+        message_id = send_preview(video_path)
+        self.upload_pool.submit(self._stage, self._upload, video_path, metadata, message_id, archived)
+    
+    def _upload(self, video_path: Path, metadata: dict, message_id: int, archived):
+        try:
+            if archived is None:
+                uploaded = upload_with_tee(self._session(), video_path, metadata, message_id)
+            else:
+                uploaded = upload_video_chunked(self._session(), video_path, metadata, message_id)
+                archived.result()  # Raises if archiving failed: keep the queue copy
+            finish_video(video_path, uploaded, metadata["digest"])
+        finally:
+            self._release(video_path)
 
 
 def main():
@@ -428,35 +967,41 @@ def main():
     # Ensure queue directory exists
     queue_path.mkdir(parents=True, exist_ok=True)
     
-    # Create session with connection pooling
-    session = create_session()
+    pipeline = VideoPipeline()
+    watcher = create_watcher(queue_path, WATCH_BACKEND, POLL_INTERVAL)
+    logger.info(f"Watch backend: {type(watcher).__name__}")
     
     # Track processed files to avoid reprocessing
     processed_files = set()
+    ready = watcher.scan()
     
     while True:
         try:
-            # Scan for video files
-            for item in queue_path.iterdir():
+            for item in sorted(ready):
                 # Skip non-video files and already processed
                 if item.suffix.lower() not in VIDEO_EXTENSIONS:
                     continue
                 if item.name.startswith("."):
                     continue
-                if item in processed_files:
+                if item in processed_files or not item.exists():
                     continue
                 
-                # Process video
+                # Hand to the pipeline (returns immediately)
                 processed_files.add(item)
-                process_video(item, session)
+                pipeline.submit(item)
             
-            # Clean up processed set (remove files that no longer exist)
-            processed_files = {f for f in processed_files if f.exists()}
+            # Block until files are added or removed
+            ready, removed = watcher.wait()
+            processed_files -= removed
         
         except Exception as e:
             log_exception(logger, "Error in main loop", e)
-        
-        time.sleep(POLL_INTERVAL)
+            time.sleep(POLL_INTERVAL)
+            # Start a fresh watch; the directory may have been removed and recreated
+            watcher.close()
+            queue_path.mkdir(parents=True, exist_ok=True)
+            watcher = create_watcher(queue_path, WATCH_BACKEND, POLL_INTERVAL)
+            ready = watcher.scan()
 
 
 if __name__ == "__main__":
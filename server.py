@@ -7,24 +7,39 @@ Designed for Railway deployment.
 """
 
 import os
+import sys
 import json
 import time
+import heapq
+import hashlib
+import queue
+import itertools
 import threading
 import asyncio
 import tempfile
 import subprocess
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from urllib.parse import unquote
 from functools import wraps
+from collections import OrderedDict
 
-from flask import Flask, request, jsonify, send_file
+import requests
+from flask import Flask, Response, request, jsonify
+from werkzeug.http import http_date, quote_etag
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 
 # Google APIs
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest, MediaFileUpload, build_http
+
+from state_store import JournalStateStore, SQLiteStateStore
 
 # Load environment variables
 load_dotenv()
@@ -37,67 +52,593 @@ TELEGRAM_USER_ID = os.getenv("TELEGRAM_USER_ID")
 TELEGRAM_BROTHER_ID = os.getenv("TELEGRAM_BROTHER_ID")
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
 GOOGLE_CREDENTIALS = os.getenv("GOOGLE_CREDENTIALS")
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite")  # "sqlite" or "journal"
+# gunicorn worker processes, as the Procfile and railway.toml start it
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or (2 if "gunicorn" in sys.modules else 1))
+
+# Telegram Bot API client
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", 5))
+TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", 30))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", 4))
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", 10))
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", 1.0))  # seconds between sends per chat
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 25))  # sends per second across all chats
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 4))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 100))  # per worker
+WEBHOOK_POLL_INTERVAL = 0.5  # seconds; leader's check for updates received by other processes
+
+# YouTube upload scheduling
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", 2))  # simultaneous YouTube uploads
+PREPROCESS_CONCURRENCY = int(os.getenv("PREPROCESS_CONCURRENCY", 1))  # simultaneous ffmpeg jobs
+UPLOAD_PRIORITY = os.getenv("UPLOAD_PRIORITY", "oldest")  # "oldest" or "shortest" (smallest file)
+SCHEDULER_POLL_INTERVAL = 2  # seconds; leader's check for videos queued by other processes
+UPLOAD_LEASE_INTERVAL = 30  # seconds between heartbeats of a running upload's owner
+UPLOAD_LEASE_TIMEOUT = 120  # an owner without a heartbeat this long is presumed dead
+YOUTUBE_QUERY_RETRIES = 4  # 5xx responses to a resumable session status query
+YOUTUBE_TOKEN_REFRESH_MARGIN = timedelta(minutes=5)  # refresh this long before expiry
+YOUTUBE_CHUNK_MODE = os.getenv("YOUTUBE_CHUNK_MODE", "adaptive")  # "adaptive" or "fixed"
+YOUTUBE_CHUNK_MB = int(os.getenv("YOUTUBE_CHUNK_MB", 10))  # fixed size / adaptive starting size
+YOUTUBE_CHUNK_MIN_MB = int(os.getenv("YOUTUBE_CHUNK_MIN_MB", 1))
+YOUTUBE_CHUNK_MAX_MB = int(os.getenv("YOUTUBE_CHUNK_MAX_MB", 64))  # each chunk is held in memory
+YOUTUBE_CHUNK_TARGET_SECONDS = float(os.getenv("YOUTUBE_CHUNK_TARGET_SECONDS", 8))
+YOUTUBE_CHUNK_ALIGNMENT = 256 * 1024  # resumable chunks must be multiples of 256 KiB
+RELAY_STALL_TIMEOUT = int(os.getenv("RELAY_STALL_TIMEOUT", 600))  # give up waiting for watcher bytes
+RELAY_POLL_INTERVAL = 0.5  # seconds between checks for newly received bytes
+PROCESSING_TIMEOUT = 600  # announce as ready after this long even if still processing
+PROCESSING_MIN_INTERVAL = 5  # seconds between processing polls, bounds
+PROCESSING_MAX_INTERVAL = 120
+YOUTUBE_LIST_MAX_IDS = 50  # videos.list accepts up to 50 ids per call
 
 # Storage paths
-UPLOAD_DIR = Path(tempfile.gettempdir()) / "yt_uploads"
+# Mount a persistent volume here: received files, state and saved YouTube sessions live in it
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR") or Path(tempfile.gettempdir()) / "yt_uploads")
 STATE_FILE = UPLOAD_DIR / "video_state.json"
+STATE_JOURNAL_FILE = UPLOAD_DIR / "video_state.journal"
+STATE_DB_FILE = UPLOAD_DIR / "video_state.db"
+LEADER_LOCK_FILE = UPLOAD_DIR / "background.lock"
+STREAM_BLOCK_SIZE = 1024 * 1024  # 1MB reads when streaming chunk bodies to disk
+CONTENT_DIGEST_SIZE = 32  # BLAKE2b-256, as computed by the watcher
+CONTENT_BLOCK_SIZE = 1024 * 1024  # content digest = digest of these blocks' digests
+ROTATION_METADATA_CONTAINERS = {".mp4", ".mov", ".m4v"}  # support a display matrix
+PREVIEW_ACCEL_REDIRECT = os.getenv("PREVIEW_ACCEL_REDIRECT", "")  # proxy location serving UPLOAD_DIR
+PREVIEW_DIR = UPLOAD_DIR / "previews"  # low-bitrate preview proxies, one per video
+PREVIEW_CACHE_MB = int(os.getenv("PREVIEW_CACHE_MB", 2048))
+PREVIEW_HEIGHT = int(os.getenv("PREVIEW_HEIGHT", 480))
+PREVIEW_VIDEO_BITRATE = os.getenv("PREVIEW_VIDEO_BITRATE", "800k")
+PREVIEW_TIMEOUT = 1800  # seconds; a hung ffmpeg must not stall the preview queue
 
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
-# In-memory state
-pending_videos = {}
-partial_uploads = {}  # filename -> {path, offset, total_size}
-upload_lock = threading.Lock()
+PREVIEW_DIR.mkdir(exist_ok=True)
+
+# State, persisted on every assignment/delete. The SQLite backend is shared by
+# all gunicorn workers; the journal backend is in-memory per process.
+if STATE_BACKEND == "journal":
+    if WEB_CONCURRENCY > 1:
+        raise RuntimeError(
+            f"STATE_BACKEND=journal keeps state in each process, so it can't serve "
+            f"{WEB_CONCURRENCY} workers; use STATE_BACKEND=sqlite or WEB_CONCURRENCY=1"
+        )
+    state_store = JournalStateStore(STATE_FILE, STATE_JOURNAL_FILE)
+else:
+    state_store = SQLiteStateStore(STATE_DB_FILE, legacy_snapshot=STATE_FILE)
+pending_videos = state_store.videos
+partial_uploads = state_store.partials  # filename -> {offset, total_size[, mode, ranges]}
+content_index = state_store.contents  # content digest -> {video_id, filename, size_bytes, received_at[, youtube_id]}
+telegram_updates = state_store.updates  # str(update_id) -> {state[, update]}
+upload_leases = state_store.leases  # video_id -> {pid, heartbeat} of the process uploading it
 
 # Video states
 STATE_AWAITING_TITLE = "awaiting_title"
 STATE_AWAITING_PRIVACY = "awaiting_privacy"
 STATE_READY_TO_UPLOAD = "ready_to_upload"
+STATE_QUEUED = "queued"
 STATE_UPLOADING = "uploading"
+STATE_PROCESSING = "processing"  # on YouTube, waiting for processing to finish
+SCHEDULED_STATES = (STATE_QUEUED, STATE_UPLOADING, STATE_PROCESSING)
 
+PRIVACY_STATUSES = ("public", "unlisted", "private")
 
-# ============== State Management ==============
+# Watcher probe results sent with each chunk: header -> (video field, parser)
+VIDEO_METADATA_HEADERS = {
+    "X-Video-Width": ("width", int),
+    "X-Video-Height": ("height", int),
+    "X-Video-Rotation": ("rotation", int),
+    "X-Video-Duration-Seconds": ("duration_sec", float),
+    "X-Video-Codec": ("codec", str),
+    "X-Video-Bitrate": ("bitrate", int),
+    "X-Content-Digest": ("digest", str)
+}
+
+# Chunk upload modes
+UPLOAD_MODE_PARALLEL = "parallel"  # chunks written out of order at their offsets
 
-def save_state():
-    """Persist state to JSON file."""
-    with upload_lock:
-        state = {
-            "pending_videos": pending_videos,
-            "partial_uploads": {k: {"offset": v["offset"], "total_size": v["total_size"]} 
-                               for k, v in partial_uploads.items()}
-        }
-        with open(STATE_FILE, "w") as f:
-            json.dump(state, f, default=str)
 
+# ============== State Management ==============
 
 def load_state():
-    """Load state from JSON file."""
-    global pending_videos, partial_uploads
-    if STATE_FILE.exists():
-        try:
-            with open(STATE_FILE) as f:
-                state = json.load(f)
-                pending_videos = state.get("pending_videos", {})
-                # Restore partial uploads (without file handles)
-                for k, v in state.get("partial_uploads", {}).items():
-                    partial_uploads[k] = v
-        except Exception as e:
-            app.logger.error(f"Failed to load state: {e}")
+    """Load persisted state (schema setup / journal replay)."""
+    try:
+        state_store.load()
+    except Exception as e:
+        app.logger.error(f"Failed to load state: {e}")
+
+
+def acquire_leader_lock() -> bool:
+    """Elect one gunicorn worker to run the periodic background threads."""
+    import fcntl
+    global leader_lock_file, is_leader
+    leader_lock_file = open(LEADER_LOCK_FILE, "w")
+    try:
+        fcntl.flock(leader_lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        is_leader = True
+        return True
+    except OSError:
+        leader_lock_file.close()
+        return False
+
+
+is_leader = False  # True in the worker holding the leader lock
 
 
 def generate_video_id(filename: str) -> str:
     """Generate unique video ID."""
-    import hashlib
     timestamp = datetime.now().isoformat()
     return hashlib.md5(f"{filename}{timestamp}".encode()).hexdigest()[:12]
 
 
+def iter_request_stream(digests: tuple = ()):
+    """Yield the request body in STREAM_BLOCK_SIZE blocks.
+    
+    Memory use stays at one block per request regardless of chunk size.
+    Each block is also fed to the given hash objects.
+    """
+    while True:
+        block = request.stream.read(STREAM_BLOCK_SIZE)
+        if not block:
+            return
+        for digest in digests:
+            digest.update(block)
+        yield block
+
+
+def write_request_stream(f, digests: tuple = ()) -> int:
+    """Copy the request body into an open file at its current position."""
+    written = 0
+    for block in iter_request_stream(digests):
+        f.write(block)
+        written += len(block)
+    return written
+
+
+def pwrite_request_stream(fd: int, offset: int, digests: tuple = ()) -> int:
+    """Write the request body at a fixed file offset with os.pwrite."""
+    written = 0
+    for block in iter_request_stream(digests):
+        view = memoryview(block)
+        while view:
+            count = os.pwrite(fd, view, offset + written)
+            view = view[count:]
+            written += count
+    return written
+
+
+def preallocate_file(file_path: Path, size: int):
+    """Create or extend a file to its final size before positional writes."""
+    fd = os.open(file_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.fstat(fd).st_size < size:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(fd, 0, size)
+            else:
+                os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+def iter_file_range(f, length: int):
+    """Yield ``length`` bytes of an open file in blocks, then close it."""
+    try:
+        while length > 0:
+            block = f.read(min(STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+    finally:
+        f.close()
+
+
+def if_range_matches(etag: str, mtime: float) -> bool:
+    """Whether a Range may be honoured under the request's If-Range (RFC 9110).
+    
+    Only a strong ETag, or a date equal to the Last-Modified we send, matches.
+    """
+    if_range = request.if_range
+    if if_range.etag:
+        weak = request.headers.get("If-Range", "").lstrip().startswith("W/")
+        return not weak and if_range.etag == etag
+    if if_range.date:
+        return int(if_range.date.timestamp()) == int(mtime)
+    return True
+
+
+def send_media_file(path: Path, mimetype: str):
+    """Serve a large media file with ETag, Range/If-Range and zero-copy transfer.
+    
+    The body is the file positioned at the range start with an exact
+    Content-Length, wrapped in the server's wsgi.file_wrapper: gunicorn then
+    sends it with os.sendfile() instead of copying it through Python. With
+    PREVIEW_ACCEL_REDIRECT set, a fronting proxy (nginx) serves it instead.
+    """
+    stat = path.stat()
+    size = stat.st_size
+    etag = f"{size:x}-{stat.st_mtime_ns:x}"
+    headers = {
+        "ETag": quote_etag(etag),
+        "Last-Modified": http_date(stat.st_mtime),
+        "Accept-Ranges": "bytes"
+    }
+    
+    if PREVIEW_ACCEL_REDIRECT:
+        headers["X-Accel-Redirect"] = PREVIEW_ACCEL_REDIRECT.rstrip("/") + "/" + path.relative_to(UPLOAD_DIR).as_posix()
+        return Response(status=200, headers=headers, mimetype=mimetype)
+    
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    
+    start, end, status = 0, size, 200
+    byte_range = request.range
+    # Multi-range requests get the whole file, which RFC 9110 allows
+    if byte_range and len(byte_range.ranges) == 1 and if_range_matches(etag, stat.st_mtime):
+        span = byte_range.range_for_length(size)
+        if span is None:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status=416, headers=headers)
+        start, end = span
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["Content-Length"] = str(end - start)
+    
+    if request.method == "HEAD":
+        return Response([], status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
+    
+    f = open(path, "rb")
+    f.seek(start)
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+    body = file_wrapper(f, STREAM_BLOCK_SIZE) if file_wrapper else iter_file_range(f, end - start)
+    return Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
+
+
+# ============== Content Index ==============
+
+def new_content_digest():
+    return hashlib.blake2b(digest_size=CONTENT_DIGEST_SIZE)
+
+
+class BlockHasher:
+    """Digests each whole content block of a chunk as it streams past.
+    
+    Fed like a hash object. Blocks the chunk only partly covers are left
+    out; the chunk next to it doesn't cover them either, so finish() reads
+    them back from disk.
+    """
+    
+    def __init__(self, offset: int, total_size: int):
+        self.position = offset
+        self.total_size = total_size
+        self.current = None  # (block index, hash) of the block being fed from its start
+        self.digests = {}  # block index -> raw digest
+    
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            index, within = divmod(self.position, CONTENT_BLOCK_SIZE)
+            take = min(len(view), CONTENT_BLOCK_SIZE - within)
+            if within == 0:
+                self.current = (index, new_content_digest())
+            if self.current:
+                self.current[1].update(view[:take])
+            self.position += take
+            view = view[take:]
+            if self.current and (within + take == CONTENT_BLOCK_SIZE or self.position == self.total_size):
+                self.digests[index] = self.current[1].digest()
+                self.current = None
+
+
+class BlockDigests:
+    """Per-block digests of files being received, in a ``<file>.blocks`` sidecar.
+    
+    A file's content digest is the BLAKE2b of its CONTENT_BLOCK_SIZE blocks'
+    BLAKE2b digests, so it is checked from what the chunks already streamed
+    past, in any order and on any worker. Each accepted chunk writes its
+    blocks' raw digests at their index; only blocks split between chunks
+    (none when chunks are whole blocks, as the watcher sends them) are read
+    back when the file completes.
+    """
+    
+    def path(self, file_path: Path) -> Path:
+        return file_path.with_name(file_path.name + ".blocks")
+    
+    def reset(self, file_path: Path):
+        self.path(file_path).unlink(missing_ok=True)
+    
+    def save(self, file_path: Path, hasher: BlockHasher):
+        if not hasher.digests:
+            return
+        fd = os.open(self.path(file_path), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            for index, digest in hasher.digests.items():
+                os.pwrite(fd, digest, index * CONTENT_DIGEST_SIZE)
+        finally:
+            os.close(fd)
+    
+    def finish(self, file_path: Path, total_size: int) -> str:
+        """Hex content digest of the complete file; drops the sidecar."""
+        sidecar = self.path(file_path)
+        try:
+            saved = sidecar.read_bytes()
+        except FileNotFoundError:
+            saved = b""
+        
+        digest = new_content_digest()
+        missing = bytes(CONTENT_DIGEST_SIZE)
+        read_back = 0
+        with open(file_path, "rb") as f:
+            for index in range(-(-total_size // CONTENT_BLOCK_SIZE)):
+                block_digest = saved[index * CONTENT_DIGEST_SIZE:(index + 1) * CONTENT_DIGEST_SIZE]
+                if len(block_digest) < CONTENT_DIGEST_SIZE or block_digest == missing:
+                    f.seek(index * CONTENT_BLOCK_SIZE)
+                    block = f.read(min(CONTENT_BLOCK_SIZE, total_size - index * CONTENT_BLOCK_SIZE))
+                    read_back += len(block)
+                    block_digest = new_content_digest()
+                    block_digest.update(block)
+                    block_digest = block_digest.digest()
+                digest.update(block_digest)
+        
+        sidecar.unlink(missing_ok=True)
+        if read_back:
+            app.logger.info(f"Read back {read_back / 1024 / 1024:.1f} MB of {file_path.name} to check it")
+        return digest.hexdigest()
+
+
+block_digests = BlockDigests()
+
+
+def verify_content(filename: str, file_path: Path, total_size: int, expected: str) -> bool:
+    """Check a completed file against the watcher's digest; delete it on mismatch."""
+    actual = block_digests.finish(file_path, total_size)
+    if actual == expected:
+        return True
+    app.logger.error(f"Content digest mismatch for {filename}: "
+                     f"got {actual[:12]}, expected {expected[:12]}")
+    file_path.unlink(missing_ok=True)
+    return False
+
+
+def remember_content(video_id: str, video: dict):
+    """Record that the server holds a video's content (by its watcher digest)."""
+    digest = video.get("digest")
+    if digest:
+        content_index[digest] = {
+            "video_id": video_id,
+            "filename": video["filename"],
+            "size_bytes": video.get("size_bytes"),
+            "received_at": datetime.now().isoformat()
+        }
+
+
+def content_state(digest: str) -> str:
+    """"published", "received" or None for content the server doesn't hold."""
+    entry = content_index.get(digest)
+    if not entry:
+        return None
+    if entry.get("youtube_id"):
+        return "published"
+    video = pending_videos.get(entry["video_id"])
+    if video and video.get("digest") == digest:
+        return "received"
+    # Deleted, rejected or replaced since
+    content_index.pop(digest, None)
+    return None
+
+
+# ============== Range Tracking ==============
+
+def add_range(ranges: list, start: int, end: int) -> list:
+    """Merge [start, end) into a sorted list of disjoint [start, end) ranges."""
+    merged = []
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+
+def missing_ranges(ranges: list, total_size: int) -> list:
+    """Return the gaps in ranges that are not yet covered within [0, total_size)."""
+    missing = []
+    position = 0
+    for start, end in ranges:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < total_size:
+        missing.append([position, total_size])
+    return missing
+
+
+def contiguous_offset(ranges: list) -> int:
+    """Return how many bytes from the start of the file are complete."""
+    if ranges and ranges[0][0] == 0:
+        return ranges[0][1]
+    return 0
+
+
 # ============== Telegram Helpers ==============
 
+def request_not_sent(error: requests.RequestException) -> bool:
+    """Whether a request failed before reaching the server (connecting)."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        reason = getattr(error.args[0], "reason", error.args[0])  # Unwrap MaxRetryError
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+class TelegramClient:
+    """Shared Bot API client with pooled keep-alive connections and unified retries."""
+    
+    # Sending again may duplicate the message if the first attempt got through
+    NON_IDEMPOTENT_METHODS = {
+        "sendMessage", "sendPhoto", "sendVideo", "sendDocument", "sendMediaGroup",
+        "forwardMessage", "copyMessage"
+    }
+    
+    def __init__(self, token: str, base_url: str = TELEGRAM_API_URL,
+                 timeout: tuple = (TELEGRAM_CONNECT_TIMEOUT, TELEGRAM_READ_TIMEOUT),
+                 max_retries: int = TELEGRAM_MAX_RETRIES, pool_size: int = TELEGRAM_POOL_SIZE):
+        self.base_url = f"{base_url.rstrip('/')}/bot{token}"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+    
+    def call(self, method: str, data: dict = None, timeout=None, retries: int = None) -> dict:
+        """Call a Bot API method and return the decoded response.
+        
+        Network errors, 5xx and 429 responses are retried with exponential
+        backoff (429 waits for retry_after). Methods that send something new
+        are only retried when the request never reached Telegram: connect
+        errors and 429. Returns the last {"ok": False, ...} result once
+        attempts are exhausted.
+        """
+        retries = self.max_retries if retries is None else retries
+        idempotent = method not in self.NON_IDEMPOTENT_METHODS
+        result = {"ok": False}
+        
+        for attempt in range(retries + 1):
+            delay = 2 ** attempt
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/{method}", json=data or {}, timeout=timeout or self.timeout
+                )
+                try:
+                    result = response.json()
+                except ValueError:
+                    result = {"ok": False, "error_code": response.status_code,
+                              "description": response.text[:200]}
+                
+                retryable = response.status_code == 429 or (idempotent and response.status_code >= 500)
+                if result.get("ok") or not retryable:
+                    return result
+                delay = result.get("parameters", {}).get("retry_after", delay)
+                app.logger.warning(f"Telegram {method} attempt {attempt + 1}: "
+                                   f"{response.status_code} {result.get('description')}")
+            except requests.RequestException as e:
+                result = {"ok": False, "description": str(e)}
+                app.logger.error(f"Telegram {method} attempt {attempt + 1} failed: {e}")
+                if not idempotent and not request_not_sent(e):
+                    return result  # It may have been delivered
+            
+            if attempt < retries:
+                time.sleep(delay)
+        
+        return result
+
+
+class TelegramEditQueue:
+    """Background sender for message edits, keeping one pending edit per message.
+    
+    Enqueuing replaces any edit still waiting for the same (chat_id, message_id),
+    so superseded progress updates are dropped. Sends respect a per-chat
+    interval and a global rate, and 429 responses delay the chat by retry_after.
+    Callers never block on Telegram.
+    """
+    
+    MAX_ATTEMPTS = 3
+    
+    def __init__(self, client: TelegramClient, chat_interval: float = TELEGRAM_CHAT_INTERVAL,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE):
+        self.client = client
+        self.chat_interval = chat_interval
+        self.global_interval = 1.0 / global_rate
+        self.pending = OrderedDict()  # (chat_id, message_id) -> (method, data, attempts)
+        self.chat_ready_at = {}  # chat_id -> monotonic time the chat may send again
+        self.global_ready_at = 0.0
+        self.condition = threading.Condition()
+        self.thread = None
+    
+    def enqueue(self, method: str, data: dict):
+        """Queue an edit, replacing any older edit of the same message."""
+        key = (data["chat_id"], data["message_id"])
+        with self.condition:
+            self.pending[key] = (method, data, 0)
+            if self.thread is None:
+                # Started lazily so each gunicorn worker gets its own sender
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+    
+    def _next_ready(self):
+        """Pop the oldest edit whose chat may send now, else return the wait time."""
+        now = time.monotonic()
+        global_wait = self.global_ready_at - now
+        wait = None
+        for key, item in self.pending.items():
+            ready_in = max(self.chat_ready_at.get(key[0], 0) - now, global_wait)
+            if ready_in <= 0:
+                del self.pending[key]
+                return key, item, None
+            wait = ready_in if wait is None else min(wait, ready_in)
+        return None, None, wait
+    
+    def _run(self):
+        while True:
+            with self.condition:
+                key, item, wait = self._next_ready()
+                if key is None:
+                    self.condition.wait(wait)
+                    continue
+                now = time.monotonic()
+                self.chat_ready_at[key[0]] = now + self.chat_interval
+                self.global_ready_at = now + self.global_interval
+            
+            method, data, attempts = item
+            try:
+                self._send(key, method, data, attempts)
+            except Exception as e:
+                # Keep the sender alive: a dead thread would silently drop every later edit
+                app.logger.exception(f"Telegram {method} failed: {e}")
+    
+    def _send(self, key: tuple, method: str, data: dict, attempts: int):
+        result = self.client.call(method, data, retries=0)
+        if result.get("ok") or "message is not modified" in result.get("description", ""):
+            return
+        
+        retry_after = result.get("parameters", {}).get("retry_after")
+        error_code = result.get("error_code")
+        retryable = error_code is None or error_code == 429 or error_code >= 500
+        if not retryable or (attempts + 1 >= self.MAX_ATTEMPTS and not retry_after):
+            app.logger.warning(f"Telegram {method} dropped: {result.get('description')}")
+            return
+        
+        with self.condition:
+            self.chat_ready_at[key[0]] = time.monotonic() + (retry_after or 2 ** attempts)
+            # Re-queue unless a newer edit of this message arrived meanwhile
+            self.pending.setdefault(key, (method, data, attempts + 1))
+
+
+telegram = TelegramClient(TELEGRAM_BOT_TOKEN)
+telegram_edits = TelegramEditQueue(telegram)
+
+
 def send_telegram_message(chat_id: int, text: str, reply_markup=None) -> dict:
     """Send a Telegram message."""
-    import requests
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     data = {
         "chat_id": chat_id,
         "text": text,
@@ -106,14 +647,11 @@ def send_telegram_message(chat_id: int, text: str, reply_markup=None) -> dict:
     if reply_markup:
         data["reply_markup"] = json.dumps(reply_markup)
     
-    response = requests.post(url, json=data, timeout=30)
-    return response.json()
+    return telegram.call("sendMessage", data)
 
 
 def edit_telegram_message(chat_id: int, message_id: int, text: str, reply_markup=None) -> bool:
     """Edit an existing Telegram message."""
-    import requests
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/editMessageText"
     data = {
         "chat_id": chat_id,
         "message_id": message_id,
@@ -123,25 +661,29 @@ def edit_telegram_message(chat_id: int, message_id: int, text: str, reply_markup
     if reply_markup:
         data["reply_markup"] = json.dumps(reply_markup)
     
-    for attempt in range(5):
-        try:
-            response = requests.post(url, json=data, timeout=30)
-            if response.ok:
-                return True
-            # Handle "message is not modified" error gracefully
-            if "message is not modified" in response.text:
-                return True
-        except Exception as e:
-            app.logger.error(f"Edit message attempt {attempt + 1} failed: {e}")
-            time.sleep(2 ** attempt)
+    result = telegram.call("editMessageText", data)
+    # Handle "message is not modified" error gracefully
+    return result.get("ok") or "message is not modified" in result.get("description", "")
+
+
+def queue_telegram_edit(chat_id: int, message_id: int, text: str, reply_markup=None):
+    """Queue a message edit without waiting for Telegram."""
+    if not message_id:
+        return
+    data = {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": text,
+        "parse_mode": "HTML"
+    }
+    if reply_markup:
+        data["reply_markup"] = json.dumps(reply_markup)
     
-    return False
+    telegram_edits.enqueue("editMessageText", data)
 
 
 def edit_telegram_caption(chat_id: int, message_id: int, caption: str, reply_markup=None) -> bool:
     """Edit caption of a message with media."""
-    import requests
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/editMessageCaption"
     data = {
         "chat_id": chat_id,
         "message_id": message_id,
@@ -151,18 +693,16 @@ def edit_telegram_caption(chat_id: int, message_id: int, caption: str, reply_mar
     if reply_markup:
         data["reply_markup"] = json.dumps(reply_markup)
     
-    response = requests.post(url, json=data, timeout=30)
-    return response.ok
+    return telegram.call("editMessageCaption", data).get("ok", False)
 
 
 def answer_callback_query(callback_query_id: str, text: str = None):
     """Answer a callback query."""
-    import requests
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/answerCallbackQuery"
     data = {"callback_query_id": callback_query_id}
     if text:
         data["text"] = text
-    requests.post(url, json=data, timeout=10)
+    # A late answer is useless, so don't retry
+    telegram.call("answerCallbackQuery", data, timeout=(TELEGRAM_CONNECT_TIMEOUT, 10), retries=0)
 
 
 def create_privacy_keyboard(video_id: str):
@@ -204,46 +744,154 @@ def create_delete_confirmation_keyboard(video_id: str):
 
 # ============== YouTube Helpers ==============
 
+# Shared across threads; see get_youtube_service()
+youtube_lock = threading.RLock()
+youtube_credentials = None
+youtube_service = None
+youtube_thread_http = threading.local()
+
+
+def load_youtube_credentials() -> Credentials:
+    """Build OAuth credentials from GOOGLE_CREDENTIALS."""
+    creds_data = json.loads(GOOGLE_CREDENTIALS)
+    return Credentials(
+        token=creds_data.get("token"),
+        refresh_token=creds_data.get("refresh_token"),
+        token_uri=creds_data.get("token_uri", "https://oauth2.googleapis.com/token"),
+        client_id=creds_data.get("client_id"),
+        client_secret=creds_data.get("client_secret"),
+        scopes=creds_data.get("scopes", [
+            "https://www.googleapis.com/auth/youtube.upload",
+            "https://www.googleapis.com/auth/youtube.readonly"
+        ])
+    )
+
+
+def refresh_youtube_credentials(force: bool = False):
+    """Refresh the shared access token if it expires within the refresh margin.
+    
+    Credentials without a known expiry (as loaded from the env var) are
+    refreshed on first use, since the stored token may be stale.
+    """
+    with youtube_lock:
+        creds = youtube_credentials
+        if creds is None or not creds.refresh_token:
+            return
+        now = datetime.now(timezone.utc).replace(tzinfo=None)  # google-auth uses naive UTC
+        if not force and creds.expiry and creds.expiry - now > YOUTUBE_TOKEN_REFRESH_MARGIN:
+            return
+        
+        creds.refresh(Request())
+        # Update env var with new token (for Railway)
+        updated_creds = {
+            "token": creds.token,
+            "refresh_token": creds.refresh_token,
+            "token_uri": creds.token_uri,
+            "client_id": creds.client_id,
+            "client_secret": creds.client_secret,
+            "scopes": list(creds.scopes) if creds.scopes else []
+        }
+        os.environ["GOOGLE_CREDENTIALS"] = json.dumps(updated_creds)
+
+
+def youtube_token_refresh_thread():
+    """Background thread that refreshes the access token ahead of expiry."""
+    while True:
+        expiry = youtube_credentials.expiry
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        wait = (expiry - now - YOUTUBE_TOKEN_REFRESH_MARGIN).total_seconds() if expiry else 0
+        time.sleep(max(wait, 60))
+        try:
+            refresh_youtube_credentials()
+        except Exception as e:
+            app.logger.warning(f"YouTube token refresh failed: {e}")
+
+
+def get_youtube_http() -> AuthorizedHttp:
+    """This thread's authorized YouTube connection.
+    
+    httplib2 connections are not thread-safe, so the shared service must not
+    share one; all of them use the shared credentials.
+    """
+    thread_http = getattr(youtube_thread_http, "http", None)
+    if thread_http is None:
+        # build_http() stops httplib2 treating resumable "308 Resume Incomplete" as a redirect
+        thread_http = AuthorizedHttp(youtube_credentials, http=build_http())
+        youtube_thread_http.http = thread_http
+    return thread_http
+
+
+def build_youtube_request(http, *args, **kwargs):
+    """Run each API request on this thread's own connection."""
+    return HttpRequest(get_youtube_http(), *args, **kwargs)
+
+
 def get_youtube_service():
-    """Get authenticated YouTube service with automatic token refresh."""
+    """Get the process-wide YouTube service, built once and safe to share across threads."""
+    global youtube_credentials, youtube_service
     if not GOOGLE_CREDENTIALS:
         raise ValueError("GOOGLE_CREDENTIALS not configured")
     
     try:
-        creds_data = json.loads(GOOGLE_CREDENTIALS)
-        creds = Credentials(
-            token=creds_data.get("token"),
-            refresh_token=creds_data.get("refresh_token"),
-            token_uri=creds_data.get("token_uri", "https://oauth2.googleapis.com/token"),
-            client_id=creds_data.get("client_id"),
-            client_secret=creds_data.get("client_secret"),
-            scopes=creds_data.get("scopes", [
-                "https://www.googleapis.com/auth/youtube.upload",
-                "https://www.googleapis.com/auth/youtube.readonly"
-            ])
-        )
-        
-        # Refresh if expired
-        if creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-            # Update env var with new token (for Railway)
-            updated_creds = {
-                "token": creds.token,
-                "refresh_token": creds.refresh_token,
-                "token_uri": creds.token_uri,
-                "client_id": creds.client_id,
-                "client_secret": creds.client_secret,
-                "scopes": list(creds.scopes) if creds.scopes else []
-            }
-            os.environ["GOOGLE_CREDENTIALS"] = json.dumps(updated_creds)
+        with youtube_lock:
+            if youtube_service is None:
+                youtube_credentials = load_youtube_credentials()
+                refresh_youtube_credentials()
+                youtube_service = build(
+                    "youtube", "v3", credentials=youtube_credentials,
+                    requestBuilder=build_youtube_request
+                )
+                threading.Thread(target=youtube_token_refresh_thread, daemon=True).start()
         
-        return build("youtube", "v3", credentials=creds)
+        refresh_youtube_credentials()
+        return youtube_service
     
     except Exception as e:
         app.logger.error(f"Failed to create YouTube service: {e}")
         raise
 
 
+def cancel_upload_session(session_uri: str):
+    """Best-effort DELETE of an unfinished resumable upload session.
+    
+    An abandoned session never becomes a video and expires on its own.
+    """
+    if not session_uri:
+        return
+    try:
+        get_youtube_http().request(session_uri, method="DELETE")
+    except Exception as e:
+        app.logger.debug(f"Could not cancel YouTube upload session: {e}")
+
+
+def query_resumable_upload(session_uri: str, size: int):
+    """Ask YouTube how much of a resumable upload session it has received.
+    
+    Returns (offset, None) while the upload is incomplete, (size, video
+    resource) if it already finished, or (None, None) if the session has
+    expired and the upload must start over. 5xx responses are retried with
+    exponential backoff.
+    """
+    for attempt in range(YOUTUBE_QUERY_RETRIES + 1):
+        resp, content = get_youtube_http().request(
+            session_uri, method="PUT",
+            headers={"Content-Length": "0", "Content-Range": f"bytes */{size}"}
+        )
+        if resp.status < 500 or attempt == YOUTUBE_QUERY_RETRIES:
+            break
+        time.sleep(2 ** attempt)
+    
+    if resp.status in (200, 201):
+        return size, json.loads(content)
+    if resp.status == 308:
+        # "Range: bytes=0-N" is the last byte received; absent means none yet
+        received = resp.get("range")
+        return (int(received.split("-")[1]) + 1 if received else 0), None
+    if resp.status in (404, 410):
+        return None, None
+    raise HttpError(resp, content, uri=session_uri)
+
+
 def check_portrait_video(video_path: Path) -> bool:
     """Check if video is portrait (height > width)."""
     try:
@@ -262,9 +910,69 @@ def check_portrait_video(video_path: Path) -> bool:
     return False
 
 
-def rotate_video(video_path: Path) -> Path:
-    """Rotate video 90° clockwise for portrait videos."""
+def get_display_rotation(video_path: Path) -> int:
+    """Return the display rotation of the first video stream (degrees counter-clockwise)."""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "quiet", "-select_streams", "v:0",
+             "-show_streams", "-of", "json", str(video_path)],
+            capture_output=True, text=True, timeout=30
+        )
+        if result.returncode == 0:
+            streams = json.loads(result.stdout).get("streams", [])
+            if streams:
+                for side_data in streams[0].get("side_data_list", []):
+                    if "rotation" in side_data:
+                        return int(side_data["rotation"])
+                # Legacy rotate tag is clockwise
+                return -int(streams[0].get("tags", {}).get("rotate", 0))
+    except Exception as e:
+        app.logger.warning(f"Could not read display rotation: {e}")
+    return 0
+
+
+def rotate_video_lossless(video_path: Path, rotated_path: Path, rotation: int = None) -> bool:
+    """Rotate 90° clockwise by rewriting the display matrix; streams are copied.
+    
+    Needs ffmpeg >= 6 (-display_rotation) and an MP4/MOV container. The result
+    is verified with ffprobe; returns False so the caller can re-encode instead.
+    ``rotation`` is the input's current display rotation, probed if not given.
+    """
+    if video_path.suffix.lower() not in ROTATION_METADATA_CONTAINERS:
+        return False
+    
+    if rotation is None:
+        rotation = get_display_rotation(video_path)
+    # Same orientation the re-encode produces: current display rotation, then 90° clockwise
+    target = (rotation - 90 + 180) % 360 - 180
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-y", "-display_rotation:v:0", str(target), "-i", str(video_path),
+             "-map", "0:v", "-map", "0:a?", "-c", "copy", str(rotated_path)],
+            capture_output=True, text=True, timeout=600
+        )
+        if result.returncode != 0:
+            app.logger.info(f"Lossless rotation unavailable: {result.stderr.strip()[-200:]}")
+            return False
+        if (get_display_rotation(rotated_path) - target) % 360 != 0:
+            app.logger.info("Lossless rotation not reflected in output metadata")
+            return False
+        return True
+    except Exception as e:
+        app.logger.warning(f"Lossless rotation failed: {e}")
+        return False
+
+
+def rotate_video(video_path: Path, rotation: int = None) -> Path:
+    """Rotate video 90° clockwise for portrait videos.
+    
+    Tries a metadata-only rotation with stream copy first and falls back to
+    re-encoding with the transpose filter.
+    """
     rotated_path = video_path.with_name(f"rotated_{video_path.name}")
+    if rotate_video_lossless(video_path, rotated_path, rotation):
+        return rotated_path
+    
     try:
         subprocess.run(
             ["ffmpeg", "-y", "-i", str(video_path), "-vf", "transpose=1",
@@ -277,8 +985,130 @@ def rotate_video(video_path: Path) -> Path:
         return video_path
 
 
+def prepare_video(video_id: str):
+    """CPU-bound preprocessing before upload: rotate portrait videos."""
+    video = pending_videos.get(video_id)
+    if not video:
+        return
+    
+    if video.get("upload_path") and Path(video["upload_path"]).exists():
+        return  # Already rotated before a restart; keep the file a saved YouTube session refers to
+    
+    # Dimensions probed by the watcher, when it sent them
+    video_path = Path(video["path"])
+    if video.get("width") and video.get("height"):
+        portrait = video["height"] > video["width"]
+    else:
+        portrait = check_portrait_video(video_path)
+    
+    if portrait:
+        app.logger.info(f"Rotating portrait video: {video_path.name}")
+        queue_telegram_edit(video.get("chat_id", TELEGRAM_USER_ID), video.get("message_id"),
+                            "🔄 Rotating portrait video...")
+        video["upload_path"] = str(rotate_video(video_path, video.get("rotation")))
+        pending_videos[video_id] = video
+
+
+class ChunkSizeController:
+    """Sizes YouTube resumable chunks so each request takes about the target time.
+    
+    Per-request time includes the round trip, so short requests on a fast
+    link are mostly overhead; long ones hold more in memory and lose more on
+    a failed request. Each measured chunk moves the size toward
+    throughput * target, at most doubling or halving per step.
+    """
+    
+    def __init__(self, adaptive: bool = True):
+        self.adaptive = adaptive
+        self.chunk_size = self._clamp(YOUTUBE_CHUNK_MB * 1024 * 1024)
+        self.throughput = None  # bytes/sec, smoothed
+        self.total_bytes = 0
+        self.total_time = 0.0
+        self.requests = 0
+    
+    def _clamp(self, size: float) -> int:
+        size = int(size) // YOUTUBE_CHUNK_ALIGNMENT * YOUTUBE_CHUNK_ALIGNMENT
+        minimum = max(YOUTUBE_CHUNK_MIN_MB * 1024 * 1024, YOUTUBE_CHUNK_ALIGNMENT)
+        return max(minimum, min(size, YOUTUBE_CHUNK_MAX_MB * 1024 * 1024))
+    
+    def record(self, sent: int, elapsed: float):
+        """Record one request that sent ``sent`` bytes in ``elapsed`` seconds."""
+        self.total_bytes += sent
+        self.total_time += elapsed
+        self.requests += 1
+        if sent <= 0 or elapsed <= 0:
+            return
+        
+        rate = sent / elapsed
+        self.throughput = rate if self.throughput is None else 0.7 * self.throughput + 0.3 * rate
+        if self.adaptive:
+            ideal = self.throughput * YOUTUBE_CHUNK_TARGET_SECONDS
+            self.chunk_size = self._clamp(min(max(ideal, self.chunk_size / 2), self.chunk_size * 2))
+    
+    def mb_per_s(self) -> float:
+        return self.total_bytes / self.total_time / 1024 / 1024 if self.total_time else 0.0
+
+
+class AdaptiveMediaFileUpload(MediaFileUpload):
+    """MediaFileUpload that takes each chunk size from a ChunkSizeController."""
+    
+    def __init__(self, filename: str, controller: ChunkSizeController, **kwargs):
+        super().__init__(filename, chunksize=controller.chunk_size, resumable=True, **kwargs)
+        self.controller = controller
+        self.waited = 0.0  # seconds spent waiting for bytes, not sending them
+    
+    def chunksize(self):
+        return self.controller.chunk_size
+
+
+def received_bytes(filename: str, total_size: int) -> int:
+    """Bytes of an incoming file that have arrived contiguously from the start."""
+    upload = partial_uploads.get(filename)
+    if upload:
+        return upload.get("offset", 0)
+    file_path = UPLOAD_DIR / filename
+    return total_size if file_path.exists() and file_path.stat().st_size >= total_size else 0
+
+
+class UploadCancelled(Exception):
+    """The video was deleted while its YouTube upload was running."""
+
+
+class GrowingFileUpload(AdaptiveMediaFileUpload):
+    """Resumable media read from a file the watcher is still sending.
+    
+    Each chunk waits until its bytes have arrived (the contiguous offset in
+    partial_uploads), so YouTube receives the file while it streams in.
+    Waiting stops with UploadCancelled if the video is deleted meanwhile.
+    """
+    
+    def __init__(self, filename: str, controller: ChunkSizeController, total_size: int, video_id: str):
+        super().__init__(filename, controller)
+        self._size = total_size
+        self.name = Path(filename).name
+        self.video_id = video_id
+    
+    def has_stream(self):
+        return False  # Make next_chunk() read through getbytes(), which waits
+    
+    def getbytes(self, begin, length):
+        end = min(begin + length, self._size)
+        wait_start = time.monotonic()
+        last_received, stalled_since = -1, wait_start
+        while (received := received_bytes(self.name, self._size)) < end:
+            if self.video_id not in pending_videos:
+                raise UploadCancelled(f"{self.name} was deleted while relaying")
+            if received != last_received:
+                last_received, stalled_since = received, time.monotonic()
+            elif time.monotonic() - stalled_since > RELAY_STALL_TIMEOUT:
+                raise TimeoutError(f"No new bytes of {self.name} for {RELAY_STALL_TIMEOUT}s")
+            time.sleep(RELAY_POLL_INTERVAL)
+        self.waited += time.monotonic() - wait_start
+        return super().getbytes(begin, length)
+
+
 def upload_to_youtube(video_id: str):
-    """Upload video to YouTube in background thread."""
+    """Upload video to YouTube (runs on an upload scheduler worker)."""
     video = pending_videos.get(video_id)
     if not video:
         return
@@ -289,15 +1119,11 @@ def upload_to_youtube(video_id: str):
     try:
         # Update status
         video["state"] = STATE_UPLOADING
-        save_state()
-        edit_telegram_message(chat_id, message_id, "⏳ Uploading to YouTube...")
-        
-        video_path = Path(video["path"])
+        pending_videos[video_id] = video
+        queue_telegram_edit(chat_id, message_id, "⏳ Uploading to YouTube...")
         
-        # Check and rotate portrait videos
-        if check_portrait_video(video_path):
-            app.logger.info(f"Rotating portrait video: {video_path.name}")
-            video_path = rotate_video(video_path)
+        # Rotated copy from prepare_video(), if any
+        video_path = Path(video.get("upload_path", video["path"]))
         
         youtube = get_youtube_service()
         
@@ -320,15 +1146,49 @@ def upload_to_youtube(video_id: str):
             }
         }
         
-        # Upload with progress
-        media = MediaFileUpload(str(video_path), resumable=True, chunksize=10*1024*1024)
+        # Upload with progress; a relayed file is read as it arrives
+        chunks = ChunkSizeController(adaptive=YOUTUBE_CHUNK_MODE != "fixed")
+        if video.get("relay"):
+            media = GrowingFileUpload(str(video_path), chunks, video["size_bytes"], video_id)
+        else:
+            media = AdaptiveMediaFileUpload(str(video_path), chunks)
         upload_request = youtube.videos().insert(part="snippet,status", body=body, media_body=media)
         
+        # Continue the session saved before a restart, if YouTube still has it
         response = None
+        session = video.get("youtube_upload")
+        if session and session.get("path") == str(video_path):
+            offset, response = query_resumable_upload(session["uri"], media.size())
+            if offset is None:
+                app.logger.info(f"YouTube upload session for {video_path.name} expired, restarting")
+            else:
+                app.logger.info(f"Resuming YouTube upload of {video_path.name} at byte {offset}")
+                upload_request.resumable_uri = session["uri"]
+                upload_request.resumable_progress = offset
+        
         last_progress_update = 0
         
         while response is None:
+            sent_before, chunk_size = upload_request.resumable_progress, chunks.chunk_size
+            chunk_start, waited_before = time.monotonic(), media.waited
             status, response = upload_request.next_chunk()
+            elapsed = time.monotonic() - chunk_start - (media.waited - waited_before)
+            sent = (media.size() if response is not None else upload_request.resumable_progress) - sent_before
+            chunks.record(sent, elapsed)
+            if response is None and upload_request.resumable_uri:
+                with state_store.transaction():
+                    if video_id not in pending_videos:
+                        raise UploadCancelled(f"{video_path.name} was deleted while uploading")
+                    video["youtube_upload"] = {
+                        "uri": upload_request.resumable_uri,
+                        "offset": upload_request.resumable_progress,
+                        "path": str(video_path)
+                    }
+                    pending_videos[video_id] = video
+            app.logger.debug(
+                f"YouTube chunk {chunk_size // 1024} KiB: {sent / 1024 / 1024 / max(elapsed, 1e-6):.1f} MB/s "
+                f"in {elapsed:.2f}s, next {chunks.chunk_size // 1024} KiB"
+            )
             if status:
                 progress = int(status.progress() * 100)
                 # Update every 5% or every 5 seconds
@@ -336,71 +1196,628 @@ def upload_to_youtube(video_id: str):
                     bar_filled = int(progress / 10)
                     bar_empty = 10 - bar_filled
                     progress_bar = "▓" * bar_filled + "░" * bar_empty
-                    edit_telegram_message(
+                    queue_telegram_edit(
                         chat_id, message_id,
                         f"⏳ Uploading to YouTube...\n\n{progress_bar} {progress}%"
                     )
                     last_progress_update = progress
         
-        youtube_id = response.get("id")
-        youtube_url = f"https://youtu.be/{youtube_id}"
-        
-        # Check for immediate rejection
-        video_status = youtube.videos().list(part="status", id=youtube_id).execute()
-        if video_status.get("items"):
-            status_detail = video_status["items"][0].get("status", {})
-            rejection = status_detail.get("rejectionReason")
-            if rejection:
-                edit_telegram_message(
-                    chat_id, message_id,
-                    f"⚠️ <b>Upload Rejected</b>\n\nReason: {rejection}"
+        app.logger.info(
+            f"Uploaded {video_path.name} to YouTube: {chunks.total_bytes / 1024 / 1024:.0f} MB in "
+            f"{chunks.requests} requests, {chunks.mb_per_s():.1f} MB/s ({YOUTUBE_CHUNK_MODE} chunks)"
+        )
+        finish_youtube_upload(video_id, response.get("id"))
+    
+    except UploadCancelled as e:
+        app.logger.info(f"YouTube upload stopped: {e}")
+        cancel_upload_session(upload_request.resumable_uri)
+    
+    except Exception as e:
+        video = pending_videos.get(video_id)
+        if video and video.get("relay") and received_bytes(video["filename"], video["size_bytes"]) < video["size_bytes"]:
+            # Still arriving: complete_upload() queues it the normal way once it has
+            app.logger.warning(f"Relay upload of {video['filename']} failed, waiting for the full file: {e}")
+            video["relay"] = False
+            video["state"] = STATE_READY_TO_UPLOAD
+            pending_videos[video_id] = video
+            return
+        
+        app.logger.exception(f"YouTube upload failed: {e}")
+        queue_telegram_edit(
+            chat_id, message_id,
+            f"❌ <b>Upload Failed</b>\n\nError: {str(e)[:200]}"
+        )
+
+
+def finish_youtube_upload(video_id: str, youtube_id: str):
+    """Hand an uploaded video to the processing poller and delete the local files."""
+    video = pending_videos.get(video_id)
+    if not video:
+        return
+    
+    Path(video.get("upload_path", video["path"])).unlink(missing_ok=True)
+    Path(video["path"]).unlink(missing_ok=True)
+    preview_cache.evict(video_id)
+    video.pop("youtube_upload", None)
+    video["state"] = STATE_PROCESSING
+    video["youtube_id"] = youtube_id
+    video["processing_since"] = datetime.now().isoformat()
+    pending_videos[video_id] = video
+    
+    queue_telegram_edit(
+        video.get("chat_id", TELEGRAM_USER_ID), video.get("message_id"),
+        "⏳ Processing on YouTube..."
+    )
+    processing_poller.watch(video_id)
+
+
+def announce_youtube_video(video_id: str):
+    """Tell the user an uploaded video is ready, then forget it."""
+    video = pending_videos.get(video_id)
+    if not video:
+        return
+    
+    title = video.get("title", Path(video["path"]).stem)[:100]
+    youtube_url = f"https://youtu.be/{video['youtube_id']}"
+    
+    # Success message
+    queue_telegram_edit(
+        video.get("chat_id", TELEGRAM_USER_ID), video.get("message_id"),
+        f"✅ <b>Ready to Watch!</b>\n\n🎬 {title}\n\n🔗 {youtube_url}"
+    )
+    
+    # Notify brother if video > 10 minutes
+    duration_sec = video.get("duration_sec", 0)
+    if duration_sec > 600 and TELEGRAM_BROTHER_ID:
+        send_telegram_message(
+            int(TELEGRAM_BROTHER_ID),
+            f"🎬 New video uploaded!\n\n<b>{title}</b>\n\n🔗 {youtube_url}"
+        )
+    
+    digest = video.get("digest")
+    if digest in content_index:
+        entry = content_index[digest]
+        entry["youtube_id"] = video["youtube_id"]
+        content_index[digest] = entry
+    
+    preview_cache.evict(video_id)
+    if video_id in pending_videos:
+        del pending_videos[video_id]
+
+
+def announce_youtube_rejection(video_id: str, reason: str):
+    """Tell the user YouTube rejected an uploaded video, then forget it."""
+    video = pending_videos.get(video_id)
+    if not video:
+        return
+    
+    queue_telegram_edit(
+        video.get("chat_id", TELEGRAM_USER_ID), video.get("message_id"),
+        f"⚠️ <b>Upload Rejected</b>\n\nReason: {reason}"
+    )
+    preview_cache.evict(video_id)
+    if video_id in pending_videos:
+        del pending_videos[video_id]
+
+
+# ============== Upload Scheduler ==============
+
+# ffmpeg jobs (rotation and preview proxies) the leader runs at once
+preprocess_slots = threading.BoundedSemaphore(PREPROCESS_CONCURRENCY)
+
+
+class JobQueue:
+    """Priority queue of video ids served by a fixed number of worker threads."""
+    
+    def __init__(self, name: str, workers: int, handler):
+        self.name = name
+        self.workers = workers
+        self.handler = handler
+        self.heap = []  # (priority, sequence, video_id)
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.started = False
+    
+    def submit(self, priority, video_id: str):
+        with self.condition:
+            if not self.started:
+                for _ in range(self.workers):
+                    threading.Thread(target=self._run, daemon=True).start()
+                self.started = True
+            heapq.heappush(self.heap, (priority, next(self.sequence), video_id))
+            self.condition.notify()
+    
+    def waiting(self) -> list:
+        """Video ids still waiting, in the order they will run."""
+        with self.condition:
+            return [video_id for _, _, video_id in sorted(self.heap)]
+    
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.heap:
+                    self.condition.wait()
+                _, _, video_id = heapq.heappop(self.heap)
+            try:
+                self.handler(video_id)
+            except Exception as e:
+                app.logger.exception(f"{self.name} job failed for {video_id}: {e}")
+
+
+class UploadScheduler:
+    """Runs confirmed uploads through two bounded pools.
+    
+    Preprocessing (ffmpeg rotation, CPU-bound) and YouTube upload (network-bound)
+    have separate concurrency limits, and both queues are ordered by
+    UPLOAD_PRIORITY. Waiting videos show their queue position in Telegram.
+    
+    Videos are claimed in the shared store (state STATE_QUEUED) by whichever
+    worker confirms them; only the leader runs the pools, picking up videos
+    queued by other workers, so the limits hold across gunicorn workers.
+    
+    The process running a video holds its lease (pid and a heartbeat) in
+    the store. Queued or uploading videos are only taken over once their
+    owner has died or stopped heartbeating.
+    """
+    
+    def __init__(self, preprocess_workers: int = PREPROCESS_CONCURRENCY,
+                 upload_workers: int = UPLOAD_CONCURRENCY, policy: str = UPLOAD_PRIORITY):
+        self.policy = policy
+        self.preprocess = JobQueue("preprocess", preprocess_workers, self._preprocess)
+        self.upload = JobQueue("upload", upload_workers, self._upload)
+        self.active = set()  # video ids queued or running in this process
+        self.notified = {}  # video_id -> last queue position shown in Telegram
+        self.lock = threading.Lock()
+        self.heartbeat_started = False
+    
+    def priority(self, video: dict):
+        if self.policy == "shortest":
+            return video.get("size_mb") or 0
+        return video.get("uploaded_at") or ""
+    
+    def submit(self, video_id: str) -> bool:
+        """Queue a video for upload; returns False if it is already scheduled."""
+        with state_store.transaction():
+            video = pending_videos.get(video_id)
+            if not video or video.get("state") in SCHEDULED_STATES:
+                return False
+            video["state"] = STATE_QUEUED
+            pending_videos[video_id] = video
+        
+        if is_leader:
+            self._enqueue(video_id, STATE_QUEUED)
+        return True
+    
+    def start(self):
+        """Pick up queued and interrupted videos, then follow the store (leader only)."""
+        self.resume_queued()
+        threading.Thread(target=self._feed, daemon=True).start()
+    
+    def resume_queued(self, orphaned_only: bool = False):
+        """Re-queue videos that were waiting or uploading when their owner stopped.
+        
+        Interrupted uploads continue their saved YouTube session. Videos whose
+        owner is still alive are left alone. With ``orphaned_only``, uploading
+        videos are only taken over if a dead owner left its lease behind; a
+        failed upload releases its lease and waits for the next restart.
+        """
+        for state in (STATE_UPLOADING, STATE_QUEUED):
+            for video_id in pending_videos.find("state", state):
+                if self.owner_alive(video_id):
+                    continue
+                if orphaned_only and state == STATE_UPLOADING and video_id not in upload_leases:
+                    continue
+                if pending_videos.get(video_id, {}).get("relay"):
+                    self.start_relay(video_id)
+                else:
+                    self._enqueue(video_id, state)
+    
+    def start_relay(self, video_id: str) -> bool:
+        """Upload a video that is still arriving, outside the bounded pools.
+        
+        A relay mostly waits on the watcher, so it must not hold an upload slot.
+        """
+        with self.lock:
+            if video_id in self.active:
+                return False
+            self.active.add(video_id)
+        if not self._claim(video_id):
+            self.active.discard(video_id)
+            return False
+        threading.Thread(target=self._upload, args=(video_id,), daemon=True).start()
+        return True
+    
+    def lease(self) -> dict:
+        return {"pid": os.getpid(), "heartbeat": time.time()}
+    
+    def owner_alive(self, video_id: str) -> bool:
+        """Whether a live process holds the lease on a video."""
+        lease = upload_leases.get(video_id)
+        if not lease or time.time() - lease["heartbeat"] > UPLOAD_LEASE_TIMEOUT:
+            return False
+        if lease["pid"] == os.getpid():
+            return video_id in self.active
+        try:
+            os.kill(lease["pid"], 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass  # Alive, owned by another user
+        return True
+    
+    def _claim(self, video_id: str) -> bool:
+        """Take the lease on a video unless another live process holds it."""
+        with state_store.transaction():
+            lease = upload_leases.get(video_id)
+            if lease and lease["pid"] != os.getpid() and self.owner_alive(video_id):
+                return False
+            upload_leases[video_id] = self.lease()
+        
+        with self.lock:
+            if not self.heartbeat_started:
+                threading.Thread(target=self._heartbeat, daemon=True).start()
+                self.heartbeat_started = True
+        return True
+    
+    def _release(self, video_id: str):
+        upload_leases.pop(video_id, None)
+        self.active.discard(video_id)
+    
+    def _heartbeat(self):
+        """Keep the leases of this process's videos fresh."""
+        while True:
+            time.sleep(UPLOAD_LEASE_INTERVAL)
+            for video_id in list(self.active):
+                try:
+                    with state_store.transaction():
+                        lease = upload_leases.get(video_id)
+                        if lease and lease["pid"] == os.getpid():
+                            upload_leases[video_id] = self.lease()
+                except Exception as e:
+                    app.logger.error(f"Lease heartbeat failed for {video_id}: {e}")
+    
+    def waiting(self) -> list:
+        """Waiting video ids in overall order: upload queue first, then preprocessing."""
+        return self.upload.waiting() + self.preprocess.waiting()
+    
+    def position(self, video_id: str):
+        """1-based position among waiting videos, or None if not waiting.
+        
+        Read from the store, where the leader publishes it.
+        """
+        video = pending_videos.get(video_id) or {}
+        return video.get("queue_position") if video.get("state") == STATE_QUEUED else None
+    
+    def notify_positions(self):
+        """Publish each waiting video's queue position to the store and Telegram."""
+        for position, video_id in enumerate(self.waiting(), start=1):
+            if self.notified.get(video_id) == position:
+                continue
+            video = pending_videos.get(video_id)
+            if video:
+                self.notified[video_id] = position
+                video["queue_position"] = position
+                pending_videos[video_id] = video
+                queue_telegram_edit(
+                    video.get("chat_id", TELEGRAM_USER_ID), video.get("message_id"),
+                    f"🕒 <b>Queued for upload</b>\n\n🎬 {video.get('title', video['filename'])}\n\n"
+                    f"Position in queue: {position}"
                 )
-                return
+    
+    def _enqueue(self, video_id: str, state: str) -> bool:
+        """Add a claimed video to this process's preprocessing queue.
         
-        # Poll for processing completion
-        edit_telegram_message(chat_id, message_id, "⏳ Processing on YouTube...")
+        The video must still be in ``state``: a store scan may be stale by
+        the time a video that just finished leaves ``active``.
+        """
+        with self.lock:
+            if video_id in self.active:
+                return False
+            self.active.add(video_id)
         
-        max_poll_time = 600  # 10 minutes
-        poll_start = time.time()
+        video = pending_videos.get(video_id)
+        if not video or video.get("state") != state or not self._claim(video_id):
+            self.active.discard(video_id)
+            return False
+        
+        self.preprocess.submit(self.priority(video), video_id)
+        self.notify_positions()
+        return True
+    
+    def _feed(self):
+        """Queue videos that other workers claimed, and those a dead owner left."""
+        while True:
+            time.sleep(SCHEDULER_POLL_INTERVAL)
+            try:
+                self.resume_queued(orphaned_only=True)
+            except Exception as e:
+                app.logger.exception(f"Upload feeder error: {e}")
+    
+    def _dequeue(self, video_id: str):
+        """Clear the published position of a video that has left the waiting queues."""
+        self.notified.pop(video_id, None)
+        video = pending_videos.get(video_id)
+        if video and video.pop("queue_position", None) is not None:
+            pending_videos[video_id] = video
+    
+    def _preprocess(self, video_id: str):
+        self._dequeue(video_id)
+        try:
+            with preprocess_slots:
+                prepare_video(video_id)
+        finally:
+            video = pending_videos.get(video_id)
+            if video:
+                self.upload.submit(self.priority(video), video_id)
+            else:
+                self._release(video_id)
+            self.notify_positions()
+    
+    def _upload(self, video_id: str):
+        self._dequeue(video_id)
+        self.notify_positions()
+        try:
+            upload_to_youtube(video_id)
+        finally:
+            self._release(video_id)
+
+
+upload_scheduler = UploadScheduler()
+
+
+# ============== Processing Poller ==============
+
+class ProcessingPoller:
+    """Watches YouTube processing of all uploaded videos from one thread.
+    
+    A videos.list call costs the same quota for 1 or 50 ids, so whenever any
+    video is due every watched video rides along. Each video's next check
+    follows processingDetails' timeLeftMs when YouTube reports it, and
+    otherwise backs off exponentially.
+    
+    Only the leader polls. Videos uploaded in other workers reach it through
+    the store: it rescans for processing videos every PROCESSING_MIN_INTERVAL.
+    """
+    
+    def __init__(self):
+        self.watched = {}  # video_id -> {youtube_id, deadline, interval, next_poll}
+        self.condition = threading.Condition()
+        self.started = False
+    
+    def watch(self, video_id: str):
+        """Start polling an uploaded video (state STATE_PROCESSING), if this is the leader."""
+        if not self.started:
+            return  # The leader's next rescan picks it up
+        video = pending_videos.get(video_id)
+        if not video or not video.get("youtube_id"):
+            return
         
-        while time.time() - poll_start < max_poll_time:
-            time.sleep(30)
+        since = datetime.fromisoformat(video.get("processing_since") or datetime.now().isoformat())
+        now = time.time()
+        with self.condition:
+            if video_id in self.watched:
+                return
+            self.watched[video_id] = {
+                "youtube_id": video["youtube_id"],
+                "deadline": now + PROCESSING_TIMEOUT - (datetime.now() - since).total_seconds(),
+                "interval": PROCESSING_MIN_INTERVAL,
+                "next_poll": now + PROCESSING_MIN_INTERVAL
+            }
+            self.condition.notify()
+    
+    def start(self):
+        """Start polling processing videos (leader only)."""
+        with self.condition:
+            if self.started:
+                return
+            self.started = True
+        self.rescan()
+        threading.Thread(target=self._run, daemon=True).start()
+    
+    def rescan(self):
+        """Watch processing videos from the store: left by a restart or uploaded elsewhere."""
+        for video_id in pending_videos.find("state", STATE_PROCESSING):
+            self.watch(video_id)
+    
+    def _run(self):
+        while True:
             try:
-                status_response = youtube.videos().list(part="status,processingDetails", id=youtube_id).execute()
-                if status_response.get("items"):
-                    item = status_response["items"][0]
-                    processing = item.get("processingDetails", {})
-                    if processing.get("processingStatus") == "succeeded":
-                        break
+                with self.condition:
+                    now = time.time()
+                    due = min((w["next_poll"] for w in self.watched.values()), default=None)
+                    if due is None or due > now:
+                        wait = PROCESSING_MIN_INTERVAL if due is None else min(due - now, PROCESSING_MIN_INTERVAL)
+                        self.condition.wait(wait)
+                        due = None
+                    # Most overdue first, in case there are more than one call's worth
+                    batch = sorted(self.watched, key=lambda v: self.watched[v]["next_poll"])
+                
+                if due is None:
+                    self.rescan()
+                    continue
+                
+                for start in range(0, len(batch), YOUTUBE_LIST_MAX_IDS):
+                    video_ids = [v for v in batch[start:start + YOUTUBE_LIST_MAX_IDS] if v in self.watched]
+                    if not video_ids or self.watched[video_ids[0]]["next_poll"] > time.time():
+                        break  # Nothing due in the rest
+                    self._poll(video_ids)
             except Exception as e:
-                app.logger.warning(f"Poll error: {e}")
+                app.logger.exception(f"Processing poller error: {e}")
+                time.sleep(PROCESSING_MIN_INTERVAL)
+    
+    def _poll(self, video_ids: list):
+        """Check up to 50 videos with one videos.list call."""
+        by_youtube_id = {self.watched[v]["youtube_id"]: v for v in video_ids}
+        try:
+            response = get_youtube_service().videos().list(
+                part="status,processingDetails", id=",".join(by_youtube_id)
+            ).execute()
+            items = {item["id"]: item for item in response.get("items", [])}
+        except Exception as e:
+            app.logger.warning(f"Poll error: {e}")
+            items = {}
         
-        # Success message
-        edit_telegram_message(
-            chat_id, message_id,
-            f"✅ <b>Ready to Watch!</b>\n\n🎬 {title}\n\n🔗 {youtube_url}"
-        )
+        for youtube_id, video_id in by_youtube_id.items():
+            self._update(video_id, items.get(youtube_id, {}))
+    
+    def _update(self, video_id: str, item: dict):
+        """Announce a finished video or schedule its next check."""
+        status = item.get("status", {})
+        processing = item.get("processingDetails", {})
+        now = time.time()
         
-        # Notify brother if video > 10 minutes
-        duration_sec = video.get("duration_sec", 0)
-        if duration_sec > 600 and TELEGRAM_BROTHER_ID:
-            send_telegram_message(
-                int(TELEGRAM_BROTHER_ID),
-                f"🎬 New video uploaded!\n\n<b>{title}</b>\n\n🔗 {youtube_url}"
-            )
+        with self.condition:
+            watch = self.watched[video_id]
+            rejection = status.get("rejectionReason") or status.get("failureReason")
+            if processing.get("processingStatus") == "failed":
+                rejection = rejection or processing.get("processingFailureReason", "processing failed")
+            finished = processing.get("processingStatus") == "succeeded" or now >= watch["deadline"]
+            
+            if rejection or finished:
+                del self.watched[video_id]
+            else:
+                time_left_ms = processing.get("processingProgress", {}).get("timeLeftMs")
+                if time_left_ms:
+                    watch["interval"] = int(time_left_ms) / 1000
+                else:
+                    watch["interval"] *= 2
+                watch["interval"] = max(PROCESSING_MIN_INTERVAL, min(watch["interval"], PROCESSING_MAX_INTERVAL))
+                watch["next_poll"] = min(now + watch["interval"], watch["deadline"])
+                return
         
-        # Clean up
-        video_path.unlink(missing_ok=True)
-        if video_id in pending_videos:
-            del pending_videos[video_id]
-        save_state()
+        if rejection:
+            announce_youtube_rejection(video_id, rejection)
+        else:
+            announce_youtube_video(video_id)
+
+
+processing_poller = ProcessingPoller()
+
+
+# ============== Preview Proxies ==============
+
+class PreviewCache:
+    """Low-resolution fragmented-MP4 proxies of pending videos, for /preview.
     
-    except Exception as e:
-        app.logger.exception(f"YouTube upload failed: {e}")
-        edit_telegram_message(
-            chat_id, message_id,
-            f"❌ <b>Upload Failed</b>\n\nError: {str(e)[:200]}"
-        )
+    Proxies are generated once per video on a background worker and kept
+    in PREVIEW_DIR, bounded to PREVIEW_CACHE_MB. A file's atime is its last
+    use, so least-recently-used eviction works across gunicorn workers; the
+    mtime is left alone because the ETag and Last-Modified come from it.
+    
+    Only the leader encodes, sharing preprocess_slots with rotation. It
+    picks up videos received by other workers from the store.
+    """
+    
+    def __init__(self, directory: Path = PREVIEW_DIR, max_bytes: int = PREVIEW_CACHE_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.jobs = JobQueue("preview", 1, self._generate)
+        self.lock = threading.Lock()
+        self.requested = set()  # (video_id, uploaded_at) already submitted by this process
+    
+    def path(self, video_id: str) -> Path:
+        return self.directory / f"{video_id}.mp4"
+    
+    def submit(self, video_id: str):
+        """Generate a video's proxy in the background (oldest videos first), in the leader."""
+        video = pending_videos.get(video_id)
+        if not is_leader or not video:
+            return  # The leader's feeder finds it in the store
+        key = (video_id, video.get("uploaded_at"))
+        with self.lock:
+            if key in self.requested:
+                return
+            self.requested.add(key)
+        self.jobs.submit(time.time(), video_id)
+    
+    def start(self):
+        """Follow the store for videos that need a proxy (leader only)."""
+        threading.Thread(target=self._feed, daemon=True).start()
+    
+    def _feed(self):
+        while True:
+            try:
+                for state in (STATE_AWAITING_TITLE, STATE_AWAITING_PRIVACY, STATE_READY_TO_UPLOAD):
+                    for video_id in pending_videos.find("state", state):
+                        if not self.path(video_id).exists():
+                            self.submit(video_id)
+            except Exception as e:
+                app.logger.exception(f"Preview feeder error: {e}")
+            time.sleep(SCHEDULER_POLL_INTERVAL)
+    
+    def get(self, video_id: str):
+        """Path of a video's proxy, marking it as used, or None if not ready."""
+        path = self.path(video_id)
+        try:
+            os.utime(path, (time.time(), path.stat().st_mtime))
+        except FileNotFoundError:
+            return None
+        return path
+    
+    def evict(self, video_id: str):
+        self.path(video_id).unlink(missing_ok=True)
+    
+    def clear(self):
+        for path in self.directory.glob("*.mp4"):
+            path.unlink(missing_ok=True)
+    
+    def _generate(self, video_id: str):
+        video = pending_videos.get(video_id)
+        path = self.path(video_id)
+        if not video or path.exists() or not Path(video["path"]).exists():
+            return
+        
+        # Fragmented MP4 starts playing from its first fragment, no moov at the end to fetch
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with preprocess_slots:
+                result = subprocess.run(
+                    ["ffmpeg", "-y", "-i", video["path"],
+                     "-vf", f"scale=-2:'min({PREVIEW_HEIGHT},ih)'",
+                     "-c:v", "libx264", "-preset", "veryfast", "-b:v", PREVIEW_VIDEO_BITRATE,
+                     "-maxrate", PREVIEW_VIDEO_BITRATE, "-bufsize", PREVIEW_VIDEO_BITRATE,
+                     "-c:a", "aac", "-b:a", "96k", "-ac", "2",
+                     "-movflags", "+frag_keyframe+empty_moov+default_base_moof",
+                     "-f", "mp4", str(tmp_path)],
+                    capture_output=True, timeout=PREVIEW_TIMEOUT
+                )
+        except subprocess.TimeoutExpired:
+            app.logger.warning(f"Preview proxy for {video['filename']} timed out after {PREVIEW_TIMEOUT}s")
+            tmp_path.unlink(missing_ok=True)
+            return
+        if result.returncode != 0:
+            app.logger.warning(f"Preview proxy failed for {video['filename']}: {result.stderr[-500:]}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        
+        current = pending_videos.get(video_id)
+        if not current or current.get("state") in SCHEDULED_STATES:
+            tmp_path.unlink(missing_ok=True)  # Deleted or confirmed meanwhile: nobody will preview it
+            return
+        os.replace(tmp_path, path)
+        app.logger.info(f"Preview proxy ready for {video['filename']}: {path.stat().st_size / 1024 / 1024:.1f} MB")
+        self._enforce_limit(keep=path)
+    
+    def _enforce_limit(self, keep: Path):
+        """Delete least recently used proxies until the cache fits."""
+        with self.lock:
+            entries = []
+            for path in self.directory.glob("*.mp4"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path != keep:
+                    path.unlink(missing_ok=True)
+                    total -= size
+
+
+preview_cache = PreviewCache()
 
 
 # ============== Flask Routes ==============
@@ -416,10 +1833,27 @@ def index():
 
 @app.route("/upload_status", methods=["GET"])
 def upload_status():
-    """Get current upload offset for resume."""
+    """Get current upload offset for resume.
+    
+    With ``digest``, a file the server already holds in full is reported
+    as complete, so a watcher that lost the final response stops there.
+    """
     filename = request.args.get("filename")
+    digest = request.args.get("digest")
+    if filename and filename not in partial_uploads and digest and content_state(digest):
+        return jsonify({
+            "status": "complete",
+            "offset": content_index[digest].get("size_bytes") or 0,
+            "missing": []
+        })
     if filename and filename in partial_uploads:
-        return jsonify({"offset": partial_uploads[filename].get("offset", 0)})
+        upload = partial_uploads[filename]
+        offset = upload.get("offset", 0)
+        ranges = upload.get("ranges", [[0, offset]] if offset else [])
+        return jsonify({
+            "offset": offset,
+            "missing": missing_ranges(ranges, upload.get("total_size", 0))
+        })
     return jsonify({"offset": 0})
 
 
@@ -429,13 +1863,18 @@ def upload_chunk():
     filename = request.headers.get("X-Filename")
     total_size = int(request.headers.get("X-Total-Size", 0))
     offset = int(request.headers.get("X-Offset", 0))
-    duration = request.headers.get("X-Video-Duration", "")
-    creation_time = request.headers.get("X-Video-Creation-Time", "")
-    message_id = request.headers.get("X-Message-Id")
     
     if not filename:
         return jsonify({"error": "Missing filename"}), 400
     
+    # A retried chunk of a file that was already received in full
+    content_digest = request.headers.get("X-Content-Digest")
+    if filename not in partial_uploads and content_digest and content_state(content_digest):
+        return jsonify({"status": "complete", "video_id": content_index[content_digest]["video_id"]})
+    
+    if request.headers.get("X-Upload-Mode") == UPLOAD_MODE_PARALLEL:
+        return upload_chunk_parallel(filename, total_size, offset)
+    
     # Check offset
     if filename in partial_uploads:
         expected_offset = partial_uploads[filename].get("offset", 0)
@@ -444,54 +1883,253 @@ def upload_chunk():
     
     # Write chunk
     file_path = UPLOAD_DIR / filename
-    mode = "ab" if offset > 0 else "wb"
+    if offset > 0 and not file_path.exists():
+        partial_uploads.pop(filename, None)
+        return jsonify({"error": "Offset mismatch", "expected_offset": 0}), 409
     
-    with open(file_path, mode) as f:
-        chunk_data = request.get_data()
-        f.write(chunk_data)
+    # Digests of this chunk and of its content blocks, fed while streaming
+    chunk_digest = request.headers.get("X-Chunk-Digest")
+    chunk_hash = new_content_digest() if chunk_digest else None
+    blocks = BlockHasher(offset, total_size)
+    if offset == 0:
+        block_digests.reset(file_path)
     
-    new_offset = offset + len(chunk_data)
-    partial_uploads[filename] = {"offset": new_offset, "total_size": total_size}
+    # Stream straight to disk at the chunk's offset; truncating afterwards drops
+    # any bytes left behind by an earlier attempt that disconnected mid-chunk
+    with open(file_path, "r+b" if offset > 0 else "wb") as f:
+        f.seek(offset)
+        received = write_request_stream(f, tuple(d for d in (chunk_hash, blocks) if d))
+        if chunk_hash and chunk_hash.hexdigest() != chunk_digest:
+            # Corrupted in transit: drop it and have the watcher resend this chunk
+            f.truncate(offset)
+            app.logger.warning(f"Chunk digest mismatch for {filename} at {offset}")
+            return jsonify({"error": "Chunk digest mismatch", "expected_offset": offset}), 422
+        f.truncate()
+    
+    new_offset = offset + received
+    block_digests.save(file_path, blocks)
     
-    # Check if complete
+    # Check if complete; the partial entry keeps a relay off the last bytes until verified
     if new_offset >= total_size:
-        # Create pending video entry
-        video_id = generate_video_id(filename)
-        
-        # Check for duplicates
-        for vid, vdata in pending_videos.items():
-            if vdata.get("filename") == filename:
-                # Update existing entry
-                video_id = vid
-                break
-        
-        pending_videos[video_id] = {
-            "path": str(file_path),
-            "filename": filename,
-            "size_mb": round(total_size / (1024 * 1024), 2),
-            "uploaded_at": datetime.now().isoformat(),
-            "creation_time": creation_time,
-            "duration": duration,
-            "state": STATE_AWAITING_TITLE,
-            "chat_id": int(TELEGRAM_USER_ID) if TELEGRAM_USER_ID else None,
-            "message_id": int(message_id) if message_id else None
-        }
-        
-        del partial_uploads[filename]
-        save_state()
-        
-        # Update Telegram message
-        if message_id:
-            edit_telegram_caption(
-                int(TELEGRAM_USER_ID), int(message_id),
-                f"🎬 <b>{filename}</b>\n\n💬 Reply with a title for this video",
-                None
-            )
+        return finish_received_file(filename, file_path, total_size, content_digest)
+    
+    partial_uploads[filename] = {"offset": new_offset, "total_size": total_size}
+    maybe_start_relay(filename, total_size)
+    return jsonify({"status": "partial", "offset": new_offset})
+
+
+def upload_chunk_parallel(filename: str, total_size: int, offset: int):
+    """Write one chunk at its offset; chunks may arrive concurrently and out of order."""
+    if total_size <= 0 or not 0 <= offset < total_size:
+        return jsonify({"error": "Invalid offset"}), 400
+    
+    file_path = UPLOAD_DIR / filename
+    with state_store.transaction():
+        upload = partial_uploads.get(filename)
+        if (not upload or upload.get("mode") != UPLOAD_MODE_PARALLEL
+                or upload.get("total_size") != total_size or not file_path.exists()):
+            # Keep bytes from an earlier serial upload of the same file
+            ranges = []
+            if upload and file_path.exists() and upload.get("total_size") == total_size:
+                ranges = upload.get("ranges") or ([[0, upload["offset"]]] if upload.get("offset") else [])
+            if not ranges:
+                block_digests.reset(file_path)
+            preallocate_file(file_path, total_size)
+            upload = {
+                "offset": contiguous_offset(ranges),
+                "total_size": total_size,
+                "mode": UPLOAD_MODE_PARALLEL,
+                "ranges": ranges
+            }
+            partial_uploads[filename] = upload
+    
+    chunk_digest = request.headers.get("X-Chunk-Digest")
+    chunk_hash = new_content_digest() if chunk_digest else None
+    blocks = BlockHasher(offset, total_size)
+    fd = os.open(file_path, os.O_WRONLY)
+    try:
+        received = pwrite_request_stream(fd, offset, tuple(d for d in (chunk_hash, blocks) if d))
+    finally:
+        os.close(fd)
+    
+    if chunk_hash and chunk_hash.hexdigest() != chunk_digest:
+        # Leave the range missing; the watcher resends this chunk
+        app.logger.warning(f"Chunk digest mismatch for {filename} at {offset}")
+        return jsonify({"error": "Chunk digest mismatch", "expected_offset": offset}), 422
+    block_digests.save(file_path, blocks)
+    
+    with state_store.transaction():
+        upload = partial_uploads.get(filename)
+        if not upload or upload.get("mode") != UPLOAD_MODE_PARALLEL or upload.get("finishing"):
+            # A concurrent chunk already finalized this file
+            return jsonify({"status": "partial", "offset": total_size, "missing": []})
         
+        ranges = add_range(upload["ranges"], offset, min(offset + received, total_size))
+        missing = missing_ranges(ranges, total_size)
+        if missing:
+            upload["ranges"] = ranges
+            upload["offset"] = contiguous_offset(ranges)
+        else:
+            # Leave the offset where it was: a relay must not read the last bytes before they are verified
+            upload["finishing"] = True
+        partial_uploads[filename] = upload
+    
+    if not missing:
+        return finish_received_file(filename, file_path, total_size, request.headers.get("X-Content-Digest"))
+    
+    maybe_start_relay(filename, total_size)
+    return jsonify({"status": "partial", "offset": upload["offset"], "missing": missing})
+
+
+def finish_received_file(filename: str, file_path: Path, total_size: int, content_digest: str):
+    """Verify a fully received file, then drop its partial entry and register it.
+    
+    On a digest mismatch a relay that was reading the file is cancelled.
+    """
+    verified = not content_digest or verify_content(filename, file_path, total_size, content_digest)
+    block_digests.reset(file_path)
+    partial_uploads.pop(filename, None)
+    if not verified:
+        cancel_relay(filename)
+        return jsonify({"error": "Content digest mismatch", "status": "rejected", "expected_offset": 0}), 422
+    return complete_upload(filename, total_size)
+
+
+def cancel_relay(filename: str):
+    """Delete the pending video relaying a rejected file; its upload thread then stops."""
+    for video_id in pending_videos.find("filename", filename):
+        video = pending_videos.get(video_id)
+        if not video or not video.get("relay"):
+            continue
+        pending_videos.pop(video_id, None)
+        app.logger.warning(f"Cancelled relay of {filename}: content digest mismatch")
+        queue_telegram_edit(
+            video.get("chat_id", TELEGRAM_USER_ID), video.get("message_id"),
+            "❌ <b>Upload Failed</b>\n\nError: the received file did not match the original"
+        )
+
+
+def upload_preset() -> tuple:
+    """Title and privacy preset by the watcher's headers, or (None, None)."""
+    title = unquote(request.headers.get("X-Video-Title", "")).strip()[:100]
+    privacy = request.headers.get("X-Video-Privacy", "")
+    if title and privacy in PRIVACY_STATUSES:
+        return title, privacy
+    return None, None
+
+
+def new_video_entry(filename: str, total_size: int) -> dict:
+    """Build a pending video entry from the watcher's upload headers."""
+    message_id = request.headers.get("X-Message-Id")
+    video = {
+        "path": str(UPLOAD_DIR / filename),
+        "filename": filename,
+        "size_mb": round(total_size / (1024 * 1024), 2),
+        "size_bytes": total_size,
+        "uploaded_at": datetime.now().isoformat(),
+        "creation_time": request.headers.get("X-Video-Creation-Time", ""),
+        "duration": request.headers.get("X-Video-Duration", ""),
+        "state": STATE_AWAITING_TITLE,
+        "chat_id": int(TELEGRAM_USER_ID) if TELEGRAM_USER_ID else None,
+        "message_id": int(message_id) if message_id else None
+    }
+    
+    for header, (field, parse) in VIDEO_METADATA_HEADERS.items():
+        value = request.headers.get(header)
+        if value:
+            try:
+                video[field] = parse(value)
+            except ValueError:
+                pass
+    
+    title, privacy = upload_preset()
+    if title:
+        video["title"] = title
+        video["privacy"] = privacy
+    return video
+
+
+def maybe_start_relay(filename: str, total_size: int):
+    """Start the YouTube upload while the rest of the file is still arriving.
+    
+    Needs a preset title and privacy and landscape dimensions from the
+    watcher; anything else (portrait videos need rotating from the complete
+    file, untitled ones need the user) waits for complete_upload().
+    """
+    title, privacy = upload_preset()
+    width = int(request.headers.get("X-Video-Width") or 0)
+    height = int(request.headers.get("X-Video-Height") or 0)
+    if not title or not width or height > width or not GOOGLE_CREDENTIALS:
+        return
+    
+    with state_store.transaction():
+        if pending_videos.find("filename", filename):
+            return  # Already relaying, or an older entry for this filename
+        video_id = generate_video_id(filename)
+        video = new_video_entry(filename, total_size)
+        video["relay"] = True
+        video["state"] = STATE_UPLOADING
+        pending_videos[video_id] = video
+        upload_leases[video_id] = upload_scheduler.lease()
+    
+    app.logger.info(f"Relaying {filename} to YouTube while it arrives")
+    upload_scheduler.start_relay(video_id)
+
+
+def complete_upload(filename: str, total_size: int):
+    """Register a fully received file as a pending video."""
+    existing = pending_videos.find("filename", filename)
+    if existing and pending_videos.get(existing[0], {}).get("relay"):
+        # Already on its way to YouTube from the growing file
+        remember_content(existing[0], pending_videos[existing[0]])
+        return jsonify({"status": "complete", "video_id": existing[0]})
+    
+    digest = request.headers.get("X-Content-Digest")
+    if existing and digest and pending_videos.get(existing[0], {}).get("digest") == digest:
+        # Same content received again: keep the entry's title, privacy and state
+        return jsonify({"status": "complete", "video_id": existing[0]})
+    
+    # Create pending video entry (replacing an existing one for the same file)
+    video_id = existing[0] if existing else generate_video_id(filename)
+    video = new_video_entry(filename, total_size)
+    message_id = video["message_id"]
+    remember_content(video_id, video)
+    
+    # Preset title and privacy: nothing to ask, queue it straight away
+    if video.get("title"):
+        video["state"] = STATE_READY_TO_UPLOAD
+        pending_videos[video_id] = video
+        upload_scheduler.submit(video_id)
         return jsonify({"status": "complete", "video_id": video_id})
     
-    save_state()
-    return jsonify({"status": "partial", "offset": new_offset})
+    pending_videos[video_id] = video
+    preview_cache.evict(video_id)  # A re-upload replaces the file
+    preview_cache.submit(video_id)
+    
+    # Update Telegram message
+    if message_id:
+        edit_telegram_caption(
+            int(TELEGRAM_USER_ID), message_id,
+            f"🎬 <b>{filename}</b>\n\n💬 Reply with a title for this video",
+            None
+        )
+    
+    return jsonify({"status": "complete", "video_id": video_id})
+
+
+@app.route("/content/<digest>", methods=["GET", "HEAD"])
+def content_status(digest):
+    """Whether the server already holds or published a file, by content digest.
+    
+    The watcher asks this (HEAD) before uploading and skips the transfer on 200.
+    """
+    state = content_state(digest)
+    if not state:
+        return jsonify({"error": "Unknown content"}), 404
+    entry = content_index[digest]
+    response = jsonify({"state": state, **entry})
+    response.headers["X-Content-State"] = state
+    return response
 
 
 @app.route("/upload", methods=["POST"])
@@ -515,8 +2153,6 @@ def upload_direct():
         "chat_id": int(TELEGRAM_USER_ID) if TELEGRAM_USER_ID else None
     }
     
-    save_state()
-    
     # Send Telegram notification
     send_telegram_message(
         int(TELEGRAM_USER_ID),
@@ -526,11 +2162,112 @@ def upload_direct():
     return jsonify({"status": "complete", "video_id": video_id})
 
 
+class UpdateDispatcher:
+    """Bounded worker pool for Telegram updates, run by the leader worker.
+    
+    Any worker's webhook records the update in the shared store, keyed by
+    update_id, so a redelivery reaching another process is still dropped.
+    The leader feeds pending updates to its pool in update_id order, sharded
+    by chat id, so one thread handles each chat and its updates stay in order.
+    Handled updates are kept (without their body) for dedupe, up to
+    SEEN_UPDATES.
+    """
+    
+    SEEN_UPDATES = 1000
+    
+    def __init__(self, handler, workers: int = WEBHOOK_WORKERS, queue_size: int = WEBHOOK_QUEUE_SIZE):
+        self.handler = handler
+        self.queue_size = queue_size
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.dispatched = set()  # update keys handed to the pool, not yet done
+        self.condition = threading.Condition()
+    
+    def start(self):
+        """Start the pool and the store feeder (leader only)."""
+        for q in self.queues:
+            threading.Thread(target=self._run, args=(q,), daemon=True).start()
+        threading.Thread(target=self._feed, daemon=True).start()
+    
+    def submit(self, update: dict) -> bool:
+        """Record an update for processing; returns False if too many are pending."""
+        key = str(update["update_id"])
+        with state_store.transaction():
+            if key in telegram_updates:
+                return True  # Telegram redelivery
+            if len(telegram_updates.find("state", "pending")) >= self.queue_size * len(self.queues):
+                return False
+            telegram_updates[key] = {"state": "pending", "update": update}
+        with self.condition:
+            self.condition.notify()  # Wakes the feeder if this is the leader
+        return True
+    
+    def _feed(self):
+        while True:
+            with self.condition:
+                self.condition.wait(WEBHOOK_POLL_INTERVAL)
+            try:
+                for key in sorted(telegram_updates.find("state", "pending"), key=int):
+                    if key in self.dispatched:
+                        continue
+                    update = telegram_updates.get(key, {}).get("update")
+                    if update is None:
+                        continue
+                    self.dispatched.add(key)
+                    self.queues[hash(update_chat_id(update)) % len(self.queues)].put(update)
+                self._prune()
+            except Exception as e:
+                app.logger.exception(f"Update feeder error: {e}")
+    
+    def _prune(self):
+        done = telegram_updates.find("state", "done")
+        if len(done) > self.SEEN_UPDATES * 1.1:
+            for key in sorted(done, key=int)[:-self.SEEN_UPDATES]:
+                telegram_updates.pop(key, None)
+    
+    def _run(self, q: queue.Queue):
+        while True:
+            update = q.get()
+            key = str(update.get("update_id"))
+            try:
+                self.handler(update)
+            except Exception as e:
+                app.logger.exception(f"Failed to process update {key}: {e}")
+            try:
+                telegram_updates[key] = {"state": "done"}
+            except Exception as e:
+                app.logger.error(f"Could not mark update {key} done: {e}")
+            self.dispatched.discard(key)
+
+
+def update_chat_id(update: dict):
+    """Return the chat an update belongs to (used to keep per-chat order)."""
+    if "callback_query" in update:
+        return update["callback_query"].get("message", {}).get("chat", {}).get("id")
+    for key in ("message", "edited_message"):
+        if key in update:
+            return update[key].get("chat", {}).get("id")
+    return None
+
+
 @app.route("/webhook", methods=["POST"])
 def telegram_webhook():
-    """Handle Telegram webhook updates."""
-    data = request.get_json()
+    """Validate a Telegram update and hand it to the worker pool."""
+    if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        return jsonify({"error": "Invalid secret token"}), 403
     
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or "update_id" not in data:
+        return jsonify({"error": "Invalid update"}), 400
+    
+    if not update_dispatcher.submit(data):
+        # Telegram redelivers updates that weren't acknowledged with a 2xx
+        return jsonify({"error": "Too many pending updates"}), 503
+    
+    return jsonify({"ok": True})
+
+
+def process_update(data: dict):
+    """Handle one Telegram update (runs on the dispatcher's worker threads)."""
     # Handle callback queries (button presses)
     if "callback_query" in data:
         callback = data["callback_query"]
@@ -549,11 +2286,11 @@ def telegram_webhook():
         
         # Handle privacy selection
         if action == "privacy" and video_id in pending_videos:
-            pending_videos[video_id]["privacy"] = value
-            pending_videos[video_id]["state"] = STATE_READY_TO_UPLOAD
-            save_state()
-            
             video = pending_videos[video_id]
+            video["privacy"] = value
+            video["state"] = STATE_READY_TO_UPLOAD
+            pending_videos[video_id] = video
+            
             privacy_emoji = {"public": "🌍", "unlisted": "🔗", "private": "🔒"}.get(value, "")
             
             edit_telegram_message(
@@ -566,14 +2303,13 @@ def telegram_webhook():
         
         # Handle upload confirmation
         elif action == "action" and value == "yes" and video_id in pending_videos:
-            pending_videos[video_id]["chat_id"] = chat_id
-            pending_videos[video_id]["message_id"] = message_id
-            save_state()
+            video = pending_videos[video_id]
+            video["chat_id"] = chat_id
+            video["message_id"] = message_id
+            pending_videos[video_id] = video
             
-            # Start upload in background thread
-            thread = threading.Thread(target=upload_to_youtube, args=(video_id,))
-            thread.daemon = True
-            thread.start()
+            # Queue for the bounded upload workers
+            upload_scheduler.submit(video_id)
         
         # Handle delete button
         elif action == "action" and value == "no" and video_id in pending_videos:
@@ -587,8 +2323,8 @@ def telegram_webhook():
         elif action == "confirm" and value == "yes" and video_id in pending_videos:
             video = pending_videos[video_id]
             Path(video["path"]).unlink(missing_ok=True)
+            preview_cache.evict(video_id)
             del pending_videos[video_id]
-            save_state()
             
             edit_telegram_message(chat_id, message_id, "🗑️ Video deleted.")
         
@@ -608,7 +2344,7 @@ def telegram_webhook():
             for vid, vdata in list(pending_videos.items()):
                 Path(vdata["path"]).unlink(missing_ok=True)
             pending_videos.clear()
-            save_state()
+            preview_cache.clear()
             edit_telegram_message(chat_id, message_id, f"🗑️ Deleted {count} videos.")
         
         elif action == "cleanup" and value == "no":
@@ -670,11 +2406,12 @@ def telegram_webhook():
             reply_msg_id = message["reply_to_message"]["message_id"]
             
             # Find video by message_id
-            for vid, v in pending_videos.items():
-                if v.get("message_id") == reply_msg_id and v["state"] == STATE_AWAITING_TITLE:
+            for vid in pending_videos.find("message_id", reply_msg_id):
+                v = pending_videos.get(vid)
+                if v and v["state"] == STATE_AWAITING_TITLE:
                     v["title"] = text.strip()[:100]
                     v["state"] = STATE_AWAITING_PRIVACY
-                    save_state()
+                    pending_videos[vid] = v
                     
                     edit_telegram_caption(
                         chat_id, reply_msg_id,
@@ -682,8 +2419,9 @@ def telegram_webhook():
                         create_privacy_keyboard(vid)
                     )
                     break
-    
-    return jsonify({"ok": True})
+
+
+update_dispatcher = UpdateDispatcher(process_update)
 
 
 @app.route("/status", methods=["GET"])
@@ -697,7 +2435,8 @@ def server_status():
                 "id": vid,
                 "filename": v["filename"],
                 "state": v["state"],
-                "size_mb": v.get("size_mb")
+                "size_mb": v.get("size_mb"),
+                "queue_position": upload_scheduler.position(vid)
             }
             for vid, v in pending_videos.items()
         ]
@@ -716,11 +2455,16 @@ def preview_video(video_id):
     if video_id not in pending_videos:
         return jsonify({"error": "Video not found"}), 404
     
+    # Low-bitrate proxy once generated, else the original
+    proxy = preview_cache.get(video_id)
+    if proxy:
+        return send_media_file(proxy, "video/mp4")
+    
     video_path = Path(pending_videos[video_id]["path"])
     if not video_path.exists():
         return jsonify({"error": "File not found"}), 404
     
-    return send_file(video_path, mimetype="video/mp4")
+    return send_media_file(video_path, "video/mp4")
 
 
 @app.route("/delete/<video_id>", methods=["POST", "DELETE"])
@@ -731,8 +2475,8 @@ def delete_video(video_id):
     
     video = pending_videos[video_id]
     Path(video["path"]).unlink(missing_ok=True)
+    preview_cache.evict(video_id)
     del pending_videos[video_id]
-    save_state()
     
     return jsonify({"status": "deleted"})
 
@@ -759,7 +2503,7 @@ def cleanup_all():
     for vid, v in list(pending_videos.items()):
         Path(v["path"]).unlink(missing_ok=True)
     pending_videos.clear()
-    save_state()
+    preview_cache.clear()
     
     return jsonify({"status": "cleaned", "deleted": count})
 
@@ -775,12 +2519,12 @@ def cleanup_stale():
             uploaded_at = datetime.fromisoformat(v["uploaded_at"])
             if uploaded_at < cutoff:
                 Path(v["path"]).unlink(missing_ok=True)
+                preview_cache.evict(vid)
                 del pending_videos[vid]
                 deleted += 1
         except Exception:
             pass
     
-    save_state()
     return jsonify({"status": "cleaned", "deleted": deleted})
 
 
@@ -861,7 +2605,7 @@ def pending_reminder_thread():
         for vid, v in pending_videos.items():
             try:
                 uploaded_at = datetime.fromisoformat(v["uploaded_at"])
-                if uploaded_at < cutoff and v["state"] != STATE_UPLOADING:
+                if uploaded_at < cutoff and v["state"] not in (STATE_QUEUED, STATE_UPLOADING, STATE_PROCESSING):
                     old_videos.append(v["filename"])
             except Exception:
                 pass
@@ -877,8 +2621,6 @@ def pending_reminder_thread():
 
 def register_webhook():
     """Register Telegram webhook on startup."""
-    import requests
-    
     # Get Railway URL from environment
     railway_url = os.getenv("RAILWAY_PUBLIC_DOMAIN") or os.getenv("RAILWAY_URL", "")
     if not railway_url:
@@ -890,20 +2632,16 @@ def register_webhook():
     
     webhook_url = f"{railway_url.rstrip('/')}/webhook"
     
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/setWebhook"
     data = {"url": webhook_url}
     
     if WEBHOOK_SECRET:
         data["secret_token"] = WEBHOOK_SECRET
     
-    try:
-        response = requests.post(url, json=data, timeout=30)
-        if response.ok:
-            app.logger.info(f"Webhook registered: {webhook_url}")
-        else:
-            app.logger.error(f"Failed to register webhook: {response.text}")
-    except Exception as e:
-        app.logger.error(f"Webhook registration error: {e}")
+    result = telegram.call("setWebhook", data)
+    if result.get("ok"):
+        app.logger.info(f"Webhook registered: {webhook_url}")
+    else:
+        app.logger.error(f"Failed to register webhook: {result.get('description')}")
 
 
 # ============== Startup ==============
@@ -913,9 +2651,14 @@ def startup():
     try:
         load_state()
         
-        # Start background threads
-        threading.Thread(target=stale_cleanup_thread, daemon=True).start()
-        threading.Thread(target=pending_reminder_thread, daemon=True).start()
+        # Start background threads (in one worker only)
+        if acquire_leader_lock():
+            threading.Thread(target=stale_cleanup_thread, daemon=True).start()
+            threading.Thread(target=pending_reminder_thread, daemon=True).start()
+            update_dispatcher.start()
+            preview_cache.start()
+            upload_scheduler.start()
+            processing_poller.start()
         
         # Register webhook
         if TELEGRAM_BOT_TOKEN:
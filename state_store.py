@@ -0,0 +1,398 @@
+"""
+State persistence for the YT Video Uploader server.
+
+Provides:
+- JournaledDict: dict whose assignments and deletions are journaled, with
+  in-memory secondary indexes
+- JournalStateStore: snapshot + append-only journal of per-key changes
+- SQLiteDict: dict view over one SQLite table
+- SQLiteStateStore: SQLite database in WAL mode, shared by all gunicorn workers
+
+Both stores expose ``videos``, ``partials``, ``contents`` (content digest ->
+video), ``updates`` (Telegram update_id -> update) and ``leases`` (video_id
+-> process running its upload) mappings (with ``find()`` for indexed lookups
+on videos and updates), ``load()`` and a ``transaction()`` context manager
+for read-modify-write sequences.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from collections.abc import MutableMapping
+
+# Video fields that can be looked up without a scan
+VIDEO_INDEXES = ("filename", "message_id", "state")
+UPDATE_INDEXES = ("state",)
+
+
+class JournaledDict(MutableMapping):
+    """Dict whose assignments and deletions are appended to the store's journal.
+
+    Values are journaled whole, so after mutating a value assign it back
+    (``videos[video_id] = video``) to persist the change. ``indexes`` names
+    value fields kept in secondary indexes (field -> value -> keys) for
+    ``find()``.
+    """
+
+    def __init__(self, store: "JournalStateStore", kind: str, indexes: tuple = ()):
+        self._store = store
+        self._kind = kind
+        self._data = {}
+        self._indexes = {field: {} for field in indexes}
+        self._indexed = {}  # key -> {field: value} as last indexed
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._store.lock:
+            self._unindex(key)
+            self._data[key] = value
+            self._index(key)
+            self._store.append("set", self._kind, key, value)
+
+    def __delitem__(self, key):
+        with self._store.lock:
+            del self._data[key]
+            self._unindex(key)
+            self._store.append("delete", self._kind, key)
+
+    def __iter__(self):
+        # Iterate over a copy so other threads can modify the map meanwhile
+        return iter(list(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._store.lock:
+            self._data.clear()
+            self._reindex()
+            self._store.append("clear", self._kind)
+
+    def find(self, field: str, value) -> list:
+        """Return the keys whose value has ``field == value`` (O(1))."""
+        return list(self._indexes[field].get(value, ()))
+
+    def _index(self, key):
+        # Remember what was indexed: values may be mutated in place before
+        # being assigned back, so the old field values can't be re-read later
+        fields = {field: self._data[key].get(field) for field in self._indexes}
+        self._indexed[key] = fields
+        for field, value in fields.items():
+            if value is not None:
+                self._indexes[field].setdefault(value, set()).add(key)
+
+    def _unindex(self, key):
+        for field, value in self._indexed.pop(key, {}).items():
+            keys = self._indexes[field].get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._indexes[field][value]
+
+    def _reindex(self):
+        """Rebuild all secondary indexes from the data."""
+        self._indexed.clear()
+        for index in self._indexes.values():
+            index.clear()
+        for key in self._data:
+            self._index(key)
+
+
+class JournalStateStore:
+    """Snapshot file plus an append-only journal of per-key changes.
+
+    Each change costs one fsynced journal line. Every ``compact_every``
+    records the maps are written to a new snapshot (temp file + atomic
+    rename) and the journal is truncated. On load the snapshot is read and
+    the journal replayed on top of it; a torn final line from a crash
+    mid-write is ignored.
+    """
+
+    def __init__(self, snapshot_path: Path, journal_path: Path = None, compact_every: int = 1000):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = Path(journal_path or self.snapshot_path.with_suffix(".journal"))
+        self.compact_every = compact_every
+        self.lock = threading.RLock()
+        self.videos = JournaledDict(self, "pending_videos", VIDEO_INDEXES)
+        self.partials = JournaledDict(self, "partial_uploads")
+        self.contents = JournaledDict(self, "content_index")
+        self.updates = JournaledDict(self, "telegram_updates", UPDATE_INDEXES)
+        self.leases = JournaledDict(self, "upload_leases")
+        self._maps = {
+            "pending_videos": self.videos,
+            "partial_uploads": self.partials,
+            "content_index": self.contents,
+            "telegram_updates": self.updates,
+            "upload_leases": self.leases
+        }
+        self._journal = None
+        self._records = 0
+
+    def load(self):
+        """Rebuild state from the snapshot and journal, then compact."""
+        with self.lock:
+            for journaled in self._maps.values():
+                journaled._data.clear()
+
+            if self.snapshot_path.exists():
+                with open(self.snapshot_path) as f:
+                    state = json.load(f)
+                for kind, journaled in self._maps.items():
+                    journaled._data.update(state.get(kind, {}))
+
+            if self.journal_path.exists():
+                with open(self.journal_path) as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            break  # Torn write at the tail
+                        self._apply(record)
+
+            for journaled in self._maps.values():
+                journaled._reindex()
+            self.compact()
+
+    def _apply(self, record: dict):
+        """Apply one journal record to the in-memory maps."""
+        data = self._maps[record["kind"]]._data
+        if record["op"] == "set":
+            data[record["key"]] = record["value"]
+        elif record["op"] == "delete":
+            data.pop(record["key"], None)
+        elif record["op"] == "clear":
+            data.clear()
+
+    def append(self, op: str, kind: str, key: str = None, value=None):
+        """Append one change to the journal and fsync it."""
+        with self.lock:
+            if self._journal is None:
+                self._journal = open(self.journal_path, "a")
+            record = {"op": op, "kind": kind, "key": key, "value": value}
+            self._journal.write(json.dumps(record, default=str) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+            self._records += 1
+            if self._records >= self.compact_every:
+                self.compact()
+
+    def compact(self):
+        """Write all state to a fresh snapshot and truncate the journal."""
+        with self.lock:
+            state = {kind: journaled._data for kind, journaled in self._maps.items()}
+            tmp_path = self.snapshot_path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(state, f, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            # Replaying the old journal over the new snapshot is harmless, so a
+            # crash between the rename and the truncate loses nothing
+            if self._journal is not None:
+                self._journal.close()
+            self._journal = open(self.journal_path, "w")
+            self._records = 0
+
+    @contextmanager
+    def transaction(self):
+        """Hold the store lock across a read-modify-write sequence."""
+        with self.lock:
+            yield
+
+
+class SQLiteDict(MutableMapping):
+    """Dict view over one SQLite table; values are stored as JSON.
+
+    Every read returns a fresh copy, so after mutating a value assign it
+    back (``videos[video_id] = video``) to persist the change. ``columns``
+    are copied out of each value into indexed columns.
+    """
+
+    def __init__(self, store: "SQLiteStateStore", table: str, key_column: str, columns: tuple = ()):
+        self._store = store
+        self._table = table
+        self._key_column = key_column
+        self._columns = columns
+
+    def __getitem__(self, key):
+        row = self._store.execute(
+            f"SELECT data FROM {self._table} WHERE {self._key_column} = ?", (key,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key, value):
+        columns = (self._key_column, *self._columns, "data")
+        params = (key, *(value.get(c) for c in self._columns), json.dumps(value, default=str))
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns[1:])
+        self._store.execute(
+            f"INSERT INTO {self._table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT({self._key_column}) DO UPDATE SET {updates}",
+            params
+        )
+
+    def __delitem__(self, key):
+        cursor = self._store.execute(
+            f"DELETE FROM {self._table} WHERE {self._key_column} = ?", (key,)
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self._store.execute(
+            f"SELECT 1 FROM {self._table} WHERE {self._key_column} = ?", (key,)
+        ).fetchone() is not None
+
+    def __iter__(self):
+        rows = self._store.execute(
+            f"SELECT {self._key_column} FROM {self._table} ORDER BY rowid"
+        ).fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self):
+        return self._store.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+
+    def items(self):
+        rows = self._store.execute(
+            f"SELECT {self._key_column}, data FROM {self._table} ORDER BY rowid"
+        ).fetchall()
+        return [(key, json.loads(data)) for key, data in rows]
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def find(self, field: str, value) -> list:
+        """Return the keys whose value has ``field == value`` (indexed column)."""
+        if field not in self._columns:
+            raise KeyError(field)
+        rows = self._store.execute(
+            f"SELECT {self._key_column} FROM {self._table} WHERE {field} = ? ORDER BY rowid",
+            (value,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def clear(self):
+        self._store.execute(f"DELETE FROM {self._table}")
+
+
+class SQLiteStateStore:
+    """State in a SQLite database (WAL mode) shared across processes.
+
+    Each thread gets its own connection in autocommit mode; ``transaction()``
+    takes the database write lock (BEGIN IMMEDIATE) so read-modify-write
+    sequences are atomic across gunicorn workers and threads.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS videos (
+            video_id TEXT PRIMARY KEY,
+            filename TEXT,
+            message_id INTEGER,
+            state TEXT,
+            uploaded_at TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_videos_filename ON videos (filename);
+        CREATE INDEX IF NOT EXISTS idx_videos_message_id ON videos (message_id);
+        CREATE INDEX IF NOT EXISTS idx_videos_state ON videos (state);
+        CREATE INDEX IF NOT EXISTS idx_videos_uploaded_at ON videos (uploaded_at);
+
+        CREATE TABLE IF NOT EXISTS partial_uploads (
+            filename TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS contents (
+            digest TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS telegram_updates (
+            update_id TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_telegram_updates_state ON telegram_updates (state);
+
+        CREATE TABLE IF NOT EXISTS upload_leases (
+            video_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: Path, legacy_snapshot: Path = None):
+        self.db_path = Path(db_path)
+        self.legacy_snapshot = Path(legacy_snapshot) if legacy_snapshot else None
+        self._local = threading.local()
+        self.videos = SQLiteDict(self, "videos", "video_id", VIDEO_INDEXES + ("uploaded_at",))
+        self.partials = SQLiteDict(self, "partial_uploads", "filename")
+        self.contents = SQLiteDict(self, "contents", "digest")
+        self.updates = SQLiteDict(self, "telegram_updates", "update_id", UPDATE_INDEXES)
+        self.leases = SQLiteDict(self, "upload_leases", "video_id")
+
+    def connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    def execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        return self.connection().execute(sql, params)
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed statements as one write transaction; nests safely."""
+        conn = self.connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    def load(self):
+        """Create the schema and import state left by the JSON journal store."""
+        self.connection().executescript(self.SCHEMA)
+
+        if not self.legacy_snapshot:
+            return
+        with self.transaction():
+            if not self.legacy_snapshot.exists():
+                return  # Already migrated (possibly by another worker)
+            legacy = JournalStateStore(self.legacy_snapshot)
+            legacy.load()
+            for video_id, video in legacy.videos.items():
+                self.videos[video_id] = video
+            for filename, upload in legacy.partials.items():
+                self.partials[filename] = upload
+            for digest, content in legacy.contents.items():
+                self.contents[digest] = content
+            self.legacy_snapshot.rename(self.legacy_snapshot.with_suffix(".json.migrated"))
+            legacy.journal_path.unlink(missing_ok=True)